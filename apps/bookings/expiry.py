@@ -0,0 +1,71 @@
+'''
+Истечение ожидающих бронирований: management-команда expire_bookings
+(cron) или планировщик в веб-процессе (myproject.wsgi/asgi,
+settings.BOOKING_EXPIRY['INTERVAL']).
+Запуск в нескольких воркерах безопасен: UPDATE затрагивает только
+строки, еще находящиеся в статусе PENDING.
+'''
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+
+from apps.bookings.models import Booking
+
+
+logger = logging.getLogger(__name__)
+
+
+def expire_bookings(max_age_hours=None, chunk_size=None):
+    '''Истечь устаревшие бронирования с параметрами из settings'''
+    options = settings.BOOKING_EXPIRY
+    if max_age_hours is None:
+        max_age_hours = options['MAX_AGE_HOURS']
+    counts = Booking.expire_pending(
+        max_age=timedelta(hours=max_age_hours),
+        chunk_size=chunk_size or options['CHUNK_SIZE']
+    )
+    logger.info(
+        'Expired bookings: %d past check-in, %d older than %sh',
+        counts['check_in'], counts['age'], max_age_hours
+    )
+    return counts
+
+
+class ExpiryScheduler:
+    '''Фоновый поток, запускающий expire_bookings раз в interval секунд'''
+    def __init__(self):
+        self.thread = None
+        self.stopped = threading.Event()
+        atexit.register(self.stop)
+
+    def start(self):
+        interval = settings.BOOKING_EXPIRY['INTERVAL']
+        if not interval or self.thread is not None:
+            return
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(interval,),
+            name=type(self).__name__,
+            daemon=True
+        )
+        self.thread.start()
+
+    def run(self, interval):
+        while not self.stopped.wait(interval):
+            try:
+                expire_bookings()
+            except Exception:
+                logger.exception('Booking expiry failed')
+            finally:
+                # У потока планировщика собственное соединение с БД
+                connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+
+
+expiry_scheduler = ExpiryScheduler()
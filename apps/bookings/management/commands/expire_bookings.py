@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.bookings.expiry import expire_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        'Перевести в статус EXPIRED ожидающие бронирования старше '
+        'BOOKING_EXPIRY["MAX_AGE_HOURS"] или с прошедшей датой заезда'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=int)
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        counts = expire_bookings(
+            options['max_age_hours'], options['chunk_size']
+        )
+        self.stdout.write(
+            f'{sum(counts.values())} pending bookings expired '
+            f'({counts["check_in"]} past check-in, '
+            f'{counts["age"]} by age).'
+        )
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.bookings.stress import (
+    create_bookings,
+    confirm_concurrently,
+    find_double_bookings
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочная проверка подтверждения бронирований: параллельные '
+        'подтверждения пересекающихся бронирований (данные удаляются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=20)
+        parser.add_argument('--bookings', type=int, default=10)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--yes',
+            action='store_true',
+            help='Запустить без DEBUG (строки создаются в рабочей БД)'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['yes']:
+            raise CommandError(
+                f'The command creates and deletes rows in the '
+                f'"{connection.settings_dict["NAME"]}" database. '
+                f'Run it with DEBUG=True or pass --yes.'
+            )
+        prefix = 'stress-confirm'
+        host, bookings = create_bookings(
+            options['listings'], options['bookings'], prefix
+        )
+        try:
+            stats = confirm_concurrently(host, bookings, options['threads'])
+            overlaps = find_double_bookings(bookings)
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}-').delete()
+        self.stdout.write(
+            f'{connection.vendor}: {len(bookings)} bookings, '
+            f'{options["threads"]} threads, {stats["elapsed"]:.2f}s, '
+            f'{stats["throughput"]:.1f} confirms/s\n'
+            f'confirmed: {stats["confirmed"]}, '
+            f'conflicts: {stats["conflicts"]} '
+            f'({stats["conflicts"] / len(bookings):.0%}), '
+            f'errors: {stats["errors"]}, '
+            f'double bookings: {len(overlaps)}'
+        )
@@ -1,4 +1,6 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.contrib.auth.models import User
@@ -11,6 +13,7 @@ class BookingStatus(models.IntegerChoices):
     CONFIRMED = 1, _('Confirmed')
     REJECTED = 2, _('Rejected')
     CANCELLED = 3, _('Cancelled')
+    EXPIRED = 4, _('Expired')
 
 
 class Booking(models.Model):
@@ -43,35 +46,227 @@ class Booking(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Проверка пересечения дат для объявления
+            models.Index(
+                fields=[
+                    'listing', 'status', 'check_in_date', 'check_out_date'
+                ],
+                name='booking_listing_dates_idx'
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='booking_user_updated_idx'
+            ),
+            models.Index(
+                fields=['listing', 'updated_at'],
+                name='booking_listing_updated_idx'
+            ),
+            # Поиск устаревших ожидающих бронирований (expire_pending)
+            models.Index(
+                fields=['status', 'check_in_date'],
+                name='booking_status_check_in_idx'
+            ),
+            models.Index(
+                fields=['status', 'created_at'],
+                name='booking_status_created_idx'
+            ),
+        ]
+
+    def overlapping_bookings(self):
+        '''Подтвержденные бронирования объявления, пересекающиеся по датам'''
+        return Booking.objects.filter(
+            listing_id=self.listing_id,
+            status=BookingStatus.CONFIRMED,
+            check_in_date__lt=self.check_out_date,
+            check_out_date__gt=self.check_in_date
+        ).exclude(pk=self.pk)
+
+    def lock(self):
+        '''
+        Блокировка строки объявления до конца транзакции (см. confirm)
+        и повторное чтение статуса: он мог измениться в параллельном
+        запросе после загрузки бронирования
+        '''
+        Listing.lock_rows(Listing.objects.filter(pk=self.listing_id))
+        self.status = Booking.objects.values_list(
+            'status', flat=True
+        ).get(pk=self.pk)
 
     def confirm(self, user):
-        '''Подтверждение бронирования владельцем жилья.'''
-        if user != self.listing.owner:
+        '''
+        Подтверждение бронирования владельцем жилья.
+        Проверка пересечений и смена статуса выполняются в одной
+        транзакции под блокировкой строки объявления (SELECT ... FOR
+        UPDATE), поэтому подтверждения по одному объявлению идут
+        по очереди, а по разным объявлениям - не блокируют друг друга
+        (в SQLite - блокировка записи БД, см. Listing.lock_rows)
+        '''
+        if user.pk != self.listing.owner_id:
             raise PermissionError('Only the host can confirm the booking.')
-        if self.status != BookingStatus.PENDING:
-            raise ValueError('Only pending bookings can be confirmed.')
-        self.status = BookingStatus.CONFIRMED
-        self.save()
+        with transaction.atomic():
+            self.lock()
+            if self.status != BookingStatus.PENDING:
+                raise ValueError('Only pending bookings can be confirmed.')
+            if self.overlapping_bookings().exists():
+                raise ValueError(
+                    'The selected dates overlap with existing bookings.'
+                )
+            self.status = BookingStatus.CONFIRMED
+            self.save(update_fields=['status', 'updated_at'])
+
+    @classmethod
+    def bulk_decide(cls, user, ids, confirm):
+        '''
+        Подтверждение (confirm=True) или отклонение бронирований
+        владельцем жилья пачкой: блокировка объявлений пользователя
+        (она же проверка прав), выборка запрошенных бронирований и
+        подтвержденных в пределах их дат, проверка пересечений в памяти
+        по каждому объявлению (в том числе между подтверждаемыми) и один
+        UPDATE для успешных.
+        Возвращает результаты по id ({id, status, error})
+        и id объявлений, календарь которых изменился.
+        update() не вызывает сигналы - сброс кешей на вызывающем
+        '''
+        if confirm:
+            new_status, label = BookingStatus.CONFIRMED, 'confirmed'
+        else:
+            new_status, label = BookingStatus.REJECTED, 'rejected'
+        with transaction.atomic():
+            listing_ids = Listing.lock_rows(Listing.objects.filter(
+                owner=user,
+                pk__in=cls.objects.filter(pk__in=ids).values('listing_id')
+            ))
+            requested = {
+                pk: (listing_id, status, check_in, check_out)
+                for pk, listing_id, status, check_in, check_out
+                in cls.objects.filter(
+                    pk__in=ids, listing_id__in=listing_ids
+                ).values_list(
+                    'pk', 'listing_id', 'status',
+                    'check_in_date', 'check_out_date'
+                )
+            }
+            # Подтвержденные бронирования тех же объявлений,
+            # только в пределах дат подтверждаемых
+            reserved = defaultdict(list)
+            pending = [
+                row for row in requested.values()
+                if row[1] == BookingStatus.PENDING
+            ]
+            if confirm and pending:
+                for listing_id, check_in, check_out in cls.objects.filter(
+                    listing_id__in={row[0] for row in pending},
+                    status=BookingStatus.CONFIRMED,
+                    check_in_date__lt=max(row[3] for row in pending),
+                    check_out_date__gt=min(row[2] for row in pending)
+                ).values_list('listing_id', 'check_in_date', 'check_out_date'):
+                    reserved[listing_id].append((check_in, check_out))
+            results = []
+            accepted = []
+            for pk in ids:
+                error = None
+                if pk not in requested:
+                    error = 'Booking not found or you are not the host.'
+                else:
+                    listing_id, status, check_in, check_out = requested[pk]
+                    if status != BookingStatus.PENDING:
+                        error = (
+                            'Only pending bookings can be confirmed.'
+                            if confirm else
+                            'Only pending bookings can be rejected.'
+                        )
+                    elif confirm and any(
+                        start < check_out and end > check_in
+                        for start, end in reserved[listing_id]
+                    ):
+                        error = (
+                            'The selected dates overlap with existing bookings.'
+                        )
+                    elif confirm:
+                        reserved[listing_id].append((check_in, check_out))
+                if error is None:
+                    accepted.append(pk)
+                results.append({
+                    'id': pk,
+                    'status': None if error else label,
+                    'error': error
+                })
+            if accepted:
+                cls.objects.filter(pk__in=accepted).update(
+                    status=new_status, updated_at=timezone.now()
+                )
+        changed = (
+            {requested[pk][0] for pk in accepted} if confirm else set()
+        )
+        return results, changed
+
+    @classmethod
+    def expire_pending(cls, max_age, chunk_size, now=None):
+        '''
+        Перевод в EXPIRED ожидающих бронирований, созданных раньше
+        чем max_age (timedelta) назад или с прошедшей датой заезда
+        (заезд сегодня еще допустим, как и при создании бронирования).
+        Обновление порциями по chunk_size строк: каждый UPDATE -
+        отдельная короткая транзакция, блокировки не копятся.
+        Возвращает число истекших: {'check_in': ..., 'age': ...}
+        '''
+        now = now or timezone.now()
+        pending = cls.objects.filter(status=BookingStatus.PENDING)
+        stale = {
+            'check_in': pending.filter(
+                check_in_date__lt=timezone.localdate(now)
+            ),
+            'age': pending.filter(created_at__lt=now - max_age),
+        }
+        counts = {}
+        for reason, queryset in stale.items():
+            counts[reason] = 0
+            while True:
+                ids = list(
+                    queryset.order_by('pk').values_list('pk', flat=True)[
+                        :chunk_size
+                    ]
+                )
+                if not ids:
+                    break
+                # Бронирование могло быть подтверждено после выборки
+                counts[reason] += cls.objects.filter(
+                    pk__in=ids, status=BookingStatus.PENDING
+                ).update(status=BookingStatus.EXPIRED, updated_at=now)
+                if len(ids) < chunk_size:
+                    break
+        return counts
 
     def reject(self, user):
-        '''Отклонение бронирования владельцем жилья.'''
-        if user != self.listing.owner:
+        '''
+        Отклонение бронирования владельцем жилья
+        (под той же блокировкой объявления, что и confirm)
+        '''
+        if user.pk != self.listing.owner_id:
             raise PermissionError('Only the owner can reject the booking.')
-        if self.status != BookingStatus.PENDING:
-            raise ValueError('Only pending bookings can be rejected.')
-        self.status = BookingStatus.REJECTED
-        self.save()
+        with transaction.atomic():
+            self.lock()
+            if self.status != BookingStatus.PENDING:
+                raise ValueError('Only pending bookings can be rejected.')
+            self.status = BookingStatus.REJECTED
+            self.save(update_fields=['status', 'updated_at'])
 
     def cancel(self, user):
-        '''Отмена бронирования арендатором.'''
-        if user != self.user:
+        '''
+        Отмена бронирования арендатором
+        (под той же блокировкой объявления, что и confirm)
+        '''
+        if user.pk != self.user_id:
             raise PermissionError('Only the renter can cancel the booking.')
-        if self.status != BookingStatus.CONFIRMED:
-            raise ValueError('Only confirmed bookings can be cancelled.')
-        if not self.is_cancelable():
-            raise ValueError('It\'s too late to cancel this booking.')
-        self.status = BookingStatus.CANCELLED
-        self.save()
+        with transaction.atomic():
+            self.lock()
+            if self.status != BookingStatus.CONFIRMED:
+                raise ValueError('Only confirmed bookings can be cancelled.')
+            if not self.is_cancelable():
+                raise ValueError('It\'s too late to cancel this booking.')
+            self.status = BookingStatus.CANCELLED
+            self.save(update_fields=['status', 'updated_at'])
 
     def is_cancelable(self):
         '''Может ли арендатор отменить бронирование?'''
@@ -21,4 +21,7 @@ class ReadOnly(permissions.BasePermission):
 
 class AllowListingOwnerOrBookingUser(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.listing.owner == request.user or obj.user == request.user
+        return (
+            obj.listing.owner_id == request.user.id
+            or obj.user_id == request.user.id
+        )
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Q
@@ -36,7 +37,7 @@ class BookingSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request:
             return request.build_absolute_uri(
-                reverse('listing-detail', kwargs={'pk': obj.listing.pk})
+                reverse('listing-detail', kwargs={'pk': obj.listing_id})
             )
         return None
 
@@ -68,3 +69,27 @@ class BookingSerializer(serializers.ModelSerializer):
                 'The selected dates overlap with existing bookings.'
             )
         return data
+
+
+class BulkDecisionSerializer(serializers.Serializer):
+    '''Пакетное подтверждение или отклонение бронирований'''
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+    action = serializers.ChoiceField(choices=['confirm', 'reject'])
+
+    def validate_ids(self, value):
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.BOOKING_BULK_MAX_IDS:
+            raise serializers.ValidationError(
+                f'No more than {settings.BOOKING_BULK_MAX_IDS} '
+                f'bookings per request.'
+            )
+        return ids
+
+
+class BulkDecisionResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.CharField(allow_null=True)
+    error = serializers.CharField(allow_null=True)
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.bookings.models import BookingStatus, Booking
+from apps.listings.availability import invalidate_reserved_periods
+from apps.listings.cache import invalidate_availability
+
+
+def invalidate_calendar(listing_id):
+    invalidate_reserved_periods(listing_id)
+    invalidate_availability()
+
+
+def invalidate_calendars(listing_ids):
+    '''Сброс календарей после update() в обход сигналов'''
+    for listing_id in listing_ids:
+        invalidate_reserved_periods(listing_id)
+    if listing_ids:
+        invalidate_availability()
+
+
+@receiver(post_save, sender=Booking)
+def invalidate_calendar_on_save(sender, instance, **kwargs):
+    # Ожидающие бронирования не влияют на календарь занятости
+    if instance.status != BookingStatus.PENDING:
+        transaction.on_commit(lambda: invalidate_calendar(instance.listing_id))
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_calendar_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_calendar(instance.listing_id))
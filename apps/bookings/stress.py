@@ -0,0 +1,125 @@
+'''
+Нагрузочная проверка Booking.confirm: параллельные подтверждения
+пересекающихся бронирований из нескольких потоков
+(management-команда stress_confirm_bookings и bookings.tests).
+'''
+import threading
+import time
+from datetime import timedelta
+from queue import Empty, Queue
+
+from django.contrib.auth.models import User
+from django.db import connection, OperationalError
+from django.utils import timezone
+
+from apps.listings.models import Listing, PropertyType
+from apps.bookings.models import BookingStatus, Booking
+
+
+def create_bookings(listings, bookings_per_listing, prefix='stress'):
+    '''
+    listings объявлений, на каждое - bookings_per_listing ожидающих
+    бронирований на пересекающиеся даты (подтвердить можно только одно)
+    '''
+    host = User.objects.create_user(f'{prefix}-host')
+    guest = User.objects.create_user(f'{prefix}-guest')
+    listing_objects = Listing.objects.bulk_create([
+        Listing(
+            title=f'{prefix} {number}',
+            address=prefix,
+            property_type=PropertyType.APARTMENT,
+            rooms=1,
+            price=100,
+            owner=host
+        )
+        for number in range(listings)
+    ])
+    if listing_objects[0].pk is None:
+        listing_objects = list(
+            Listing.objects.filter(owner=host).order_by('id')
+        )
+    today = timezone.now().date()
+    bookings = Booking.objects.bulk_create([
+        Booking(
+            listing=listing,
+            user=guest,
+            check_in_date=today + timedelta(days=1 + number % 3),
+            check_out_date=today + timedelta(days=5 + number % 3),
+            price=listing.price
+        )
+        for listing in listing_objects
+        for number in range(bookings_per_listing)
+    ])
+    if bookings[0].pk is None:
+        bookings = list(
+            Booking.objects.filter(listing__owner=host).order_by('id')
+        )
+    return host, bookings
+
+
+def confirm_concurrently(host, bookings, threads):
+    '''
+    Подтвердить bookings из threads потоков.
+    Возвращает статистику: confirmed, conflicts (отказ из-за пересечения),
+    errors (ошибки БД), elapsed, throughput (подтверждений в секунду)
+    '''
+    queue = Queue()
+    for booking in bookings:
+        queue.put(booking)
+    stats = {'confirmed': 0, 'conflicts': 0, 'errors': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        try:
+            while True:
+                try:
+                    booking = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    booking.confirm(host)
+                    result = 'confirmed'
+                except ValueError:
+                    result = 'conflicts'
+                except OperationalError:
+                    result = 'errors'
+                with lock:
+                    stats[result] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['throughput'] = len(bookings) / stats['elapsed']
+    return stats
+
+
+def find_double_bookings(bookings):
+    '''Пары подтвержденных бронирований одного объявления с пересечением'''
+    confirmed = Booking.objects.filter(
+        pk__in=[booking.pk for booking in bookings],
+        status=BookingStatus.CONFIRMED
+    ).order_by('listing_id', 'check_in_date')
+    overlaps = []
+    last = None
+    for booking in confirmed:
+        if (
+            last is not None
+            and last.listing_id == booking.listing_id
+            and booking.check_in_date < last.check_out_date
+        ):
+            overlaps.append((last.pk, booking.pk))
+        if (
+            last is None
+            or last.listing_id != booking.listing_id
+            or booking.check_out_date > last.check_out_date
+        ):
+            last = booking
+    return overlaps
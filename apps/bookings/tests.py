@@ -1,3 +1,271 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.testing import QueryCountMixin
+from apps.listings.models import Listing, PropertyType
+from apps.bookings.models import BookingStatus, Booking
+from apps.bookings.stress import (
+    create_bookings,
+    confirm_concurrently,
+    find_double_bookings
+)
+
+
+class QueryCountTests(QueryCountMixin, TestCase):
+    '''Число запросов эндпоинтов бронирований не зависит от числа строк'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.counter = 0
+
+    def add_bookings(self, user=None):
+        today = timezone.now().date()
+        for _ in range(3):
+            self.counter += 1
+            listing = Listing.objects.create(
+                title=f'Flat {self.counter}',
+                address='Berlin',
+                property_type=PropertyType.APARTMENT,
+                rooms=2,
+                price=100,
+                owner=self.owner
+            )
+            Booking.objects.create(
+                listing=listing,
+                user=user or User.objects.create_user(
+                    f'user{self.counter}', f'user{self.counter}@test.de', 'pw'
+                ),
+                check_in_date=today + timedelta(days=1),
+                check_out_date=today + timedelta(days=3)
+            )
+
+    def test_booking_list(self):
+        self.client.force_authenticate(self.guest)
+        self.add_bookings(self.guest)
+        self.assertConstantQueries(
+            '/api/v1/bookings/', lambda: self.add_bookings(self.guest)
+        )
+
+    def test_my_hosted(self):
+        self.client.force_authenticate(self.owner)
+        self.add_bookings()
+        self.assertConstantQueries(
+            '/api/v1/bookings/my-hosted/', self.add_bookings
+        )
+
+
+class BulkDecisionTests(TestCase):
+    '''Пакетное подтверждение и отклонение бронирований'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.other = User.objects.create_user('other', 'other@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.listing = cls.create_listing(cls.owner)
+        cls.foreign_listing = cls.create_listing(cls.other)
+
+    @classmethod
+    def create_listing(cls, owner):
+        return Listing.objects.create(
+            title='Flat',
+            address='Berlin',
+            property_type=PropertyType.APARTMENT,
+            rooms=2,
+            price=100,
+            owner=owner
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def book(self, listing, days, status=BookingStatus.PENDING):
+        today = timezone.now().date()
+        return Booking.objects.create(
+            listing=listing,
+            user=self.guest,
+            check_in_date=today + timedelta(days=days[0]),
+            check_out_date=today + timedelta(days=days[1]),
+            status=status
+        ).pk
+
+    def test_confirm(self):
+        confirmed = self.book(self.listing, (1, 3), BookingStatus.CONFIRMED)
+        clash = self.book(self.listing, (2, 4))
+        first = self.book(self.listing, (5, 8))
+        second = self.book(self.listing, (6, 9))
+        free = self.book(self.listing, (10, 12))
+        foreign = self.book(self.foreign_listing, (1, 3))
+        missing = foreign + 100
+        ids = [confirmed, clash, first, second, free, foreign, missing]
+        response = self.client.post(
+            '/api/v1/bookings/bulk/',
+            {'ids': ids, 'action': 'confirm'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        results = {row['id']: row['status'] for row in response.data}
+        self.assertEqual(results, {
+            confirmed: None,
+            clash: None,
+            first: 'confirmed',
+            second: None,
+            free: 'confirmed',
+            foreign: None,
+            missing: None
+        })
+        self.assertEqual(
+            set(Booking.objects.filter(
+                status=BookingStatus.CONFIRMED
+            ).values_list('pk', flat=True)),
+            {confirmed, first, free}
+        )
+
+    def test_reject(self):
+        pending = self.book(self.listing, (1, 3))
+        confirmed = self.book(self.listing, (4, 6), BookingStatus.CONFIRMED)
+        response = self.client.post(
+            '/api/v1/bookings/bulk/',
+            {'ids': [pending, confirmed], 'action': 'reject'},
+            format='json'
+        )
+        self.assertEqual(
+            [row['status'] for row in response.data], ['rejected', None]
+        )
+        self.assertEqual(
+            Booking.objects.get(pk=pending).status, BookingStatus.REJECTED
+        )
+
+
+class StatusChangeTests(TestCase):
+    '''
+    Отклонение и отмена перечитывают статус под блокировкой:
+    устаревший экземпляр не перезаписывает решение другого запроса
+    '''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Flat',
+            address='Berlin',
+            property_type=PropertyType.APARTMENT,
+            rooms=2,
+            price=100,
+            owner=cls.owner
+        )
+
+    def book(self, status=BookingStatus.PENDING):
+        today = timezone.now().date()
+        return Booking.objects.create(
+            listing=self.listing,
+            user=self.guest,
+            check_in_date=today + timedelta(days=5),
+            check_out_date=today + timedelta(days=7),
+            price=100,
+            status=status
+        )
+
+    def status(self, booking):
+        return Booking.objects.values_list('status', flat=True).get(
+            pk=booking.pk
+        )
+
+    def test_reject_after_confirm(self):
+        booking = self.book()
+        stale = Booking.objects.get(pk=booking.pk)
+        booking.confirm(self.owner)
+        with self.assertRaisesMessage(
+            ValueError, 'Only pending bookings can be rejected.'
+        ):
+            stale.reject(self.owner)
+        self.assertEqual(self.status(booking), BookingStatus.CONFIRMED)
+
+    def test_cancel_after_status_change(self):
+        booking = self.book(BookingStatus.CONFIRMED)
+        stale = Booking.objects.get(pk=booking.pk)
+        Booking.objects.filter(pk=booking.pk).update(
+            status=BookingStatus.EXPIRED
+        )
+        with self.assertRaisesMessage(
+            ValueError, 'Only confirmed bookings can be cancelled.'
+        ):
+            stale.cancel(self.guest)
+        self.assertEqual(self.status(booking), BookingStatus.EXPIRED)
+
+    def test_only_status_saved(self):
+        pending, confirmed = self.book(), self.book(BookingStatus.CONFIRMED)
+        for booking in [pending, confirmed]:
+            # Изменение в другом запросе не перезаписывается
+            Booking.objects.filter(pk=booking.pk).update(price=150)
+            booking.price = 1
+        pending.reject(self.owner)
+        confirmed.cancel(self.guest)
+        self.assertEqual(
+            dict(Booking.objects.values_list('status', 'price')),
+            {BookingStatus.REJECTED: 150, BookingStatus.CANCELLED: 150}
+        )
+
+    def test_permissions(self):
+        booking = self.book()
+        with self.assertRaises(PermissionError):
+            booking.reject(self.guest)
+        booking = self.book(BookingStatus.CONFIRMED)
+        with self.assertRaises(PermissionError):
+            booking.cancel(self.owner)
+
+
+class ExpiryTests(TestCase):
+    '''Истечение устаревших ожидающих бронирований'''
+    def test_expire_bookings(self):
+        host, bookings = create_bookings(listings=1, bookings_per_listing=5)
+        today = timezone.now().date()
+        started, old, fresh, confirmed, same_day = [
+            booking.pk for booking in bookings
+        ]
+        Booking.objects.filter(pk__in=[started, confirmed]).update(
+            check_in_date=today - timedelta(days=1)
+        )
+        # Заезд сегодня: владелец еще может подтвердить бронирование
+        Booking.objects.filter(pk=same_day).update(check_in_date=today)
+        Booking.objects.filter(pk=old).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        Booking.objects.filter(pk=confirmed).update(
+            status=BookingStatus.CONFIRMED
+        )
+        out = StringIO()
+        call_command(
+            'expire_bookings', max_age_hours=24, chunk_size=1, stdout=out
+        )
+        self.assertIn('2 pending bookings expired', out.getvalue())
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[started], BookingStatus.EXPIRED)
+        self.assertEqual(statuses[old], BookingStatus.EXPIRED)
+        self.assertEqual(statuses[fresh], BookingStatus.PENDING)
+        self.assertEqual(statuses[confirmed], BookingStatus.CONFIRMED)
+        self.assertEqual(statuses[same_day], BookingStatus.PENDING)
+
+
+class ConcurrentConfirmTests(TransactionTestCase):
+    '''
+    Параллельные подтверждения пересекающихся бронирований:
+    на каждое объявление подтверждается ровно одно
+    '''
+    def test_concurrent_confirm(self):
+        host, bookings = create_bookings(listings=4, bookings_per_listing=6)
+        stats = confirm_concurrently(host, bookings, threads=6)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['confirmed'], 4)
+        self.assertEqual(stats['conflicts'], 20)
+        self.assertEqual(find_double_bookings(bookings), [])
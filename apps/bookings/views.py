@@ -6,7 +6,12 @@ from drf_spectacular.utils import extend_schema_view, extend_schema
 
 from apps.listings.serializers import ChoicesSerializer
 from apps.bookings.models import BookingStatus, Booking
-from apps.bookings.serializers import BookingSerializer
+from apps.bookings.serializers import (
+    BookingSerializer,
+    BulkDecisionSerializer,
+    BulkDecisionResultSerializer
+)
+from apps.bookings.signals import invalidate_calendars
 from apps.bookings.permissions import (
     ReadOnly, AllowListingOwnerOrBookingUser
 )
@@ -44,12 +49,15 @@ class BookingViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        # Арендатор с профилем для BookingSerializer.user
+        queryset = Booking.objects.select_related('user__profile')
         if self.action == 'list':
-            return Booking.objects.filter(user=self.request.user)
-        return Booking.objects.all()
+            return queryset.filter(user=self.request.user)
+        # Объявление нужно для проверки прав владельца
+        return queryset.select_related('listing')
 
     def get_permissions(self):
-        if self.action in ['create', 'my_hosted']:
+        if self.action in ['create', 'my_hosted', 'bulk']:
             return [permissions.IsAuthenticated()]
         elif self.action in ['confirm', 'reject', 'cancel']:
             return [AllowListingOwnerOrBookingUser()]
@@ -64,7 +72,9 @@ class BookingViewSet(viewsets.ModelViewSet):
     @extend_schema(summary="Получить список всех бронирований где аутентифицированный пользователь является арендодателем")
     @action(methods=['get'], detail=False, url_path='my-hosted')
     def my_hosted(self, request):
-        queryset = Booking.objects.filter(listing__owner=request.user)
+        queryset = Booking.objects.filter(
+            listing__owner=request.user
+        ).select_related('user__profile')
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -92,6 +102,24 @@ class BookingViewSet(viewsets.ModelViewSet):
         except ValueError as e:
             raise ValidationError(str(e))
 
+    @extend_schema(
+        summary="Подтвердить или отклонить несколько бронирований арендодателем",
+        request=BulkDecisionSerializer,
+        responses=BulkDecisionResultSerializer(many=True)
+    )
+    @action(methods=['post'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        serializer = BulkDecisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, listing_ids = Booking.bulk_decide(
+            request.user,
+            serializer.validated_data['ids'],
+            confirm=serializer.validated_data['action'] == 'confirm'
+        )
+        # update() не вызывает сигналы bookings.signals
+        invalidate_calendars(listing_ids)
+        return Response(BulkDecisionResultSerializer(results, many=True).data)
+
     @extend_schema(summary="Отменить бронирование арендатором")
     @action(methods=['post'], detail=True, url_path='cancel')
     def cancel(self, request, pk=None):
@@ -1,6 +1,11 @@
 from django.contrib import admin
 
-from apps.listings.models import Listing, ViewHistory, SearchHistory
+from apps.listings.models import (
+    Listing,
+    ViewHistory,
+    SearchHistory,
+    SearchTermStats
+)
 
 
 @admin.register(Listing)
@@ -16,3 +21,8 @@ class ViewHistoryModelAdmin(admin.ModelAdmin):
 @admin.register(SearchHistory)
 class LSearchHistoryModelAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(SearchTermStats)
+class SearchTermStatsModelAdmin(admin.ModelAdmin):
+    pass
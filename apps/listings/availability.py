@@ -0,0 +1,106 @@
+'''
+Календарь занятости объявлений: подтвержденные бронирования в окне
+[date_from, date_to) объединяются в непрерывные периоды.
+Результат кешируется по объявлению и окну в кеше объявлений
+(listings.cache.get_cache), кеш сбрасывается сменой версии ключа
+(bookings.signals.py).
+'''
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from apps.bookings.models import BookingStatus, Booking
+from apps.listings.cache import get_cache, cache_timeout
+
+
+def merge_periods(periods):
+    '''
+    Объединение пересекающихся и смежных периодов,
+    periods - [(check_in, check_out), ...] отсортированные по check_in
+    '''
+    merged = []
+    for check_in, check_out in periods:
+        if merged and check_in <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], check_out)
+        else:
+            merged.append([check_in, check_out])
+    return [(check_in, check_out) for check_in, check_out in merged]
+
+
+def periods_to_bitmap(periods, date_from, date_to):
+    '''Строка из 0/1 по дням окна: 1 - ночь занята'''
+    bitmap = ['0'] * (date_to - date_from).days
+    for check_in, check_out in periods:
+        start = (check_in - date_from).days
+        end = (check_out - date_from).days
+        bitmap[start:end] = '1' * (end - start)
+    return ''.join(bitmap)
+
+
+def version_key(listing_id):
+    return f'listing-calendar-version:{listing_id}'
+
+
+def invalidate_reserved_periods(listing_id):
+    '''Новая версия ключа делает недоступными все окна объявления'''
+    version = time.time_ns()
+    get_cache().set(version_key(listing_id), version, None)
+    return version
+
+
+def get_versions(listing_ids):
+    versions = get_cache().get_many([version_key(pk) for pk in listing_ids])
+    return {
+        pk: versions.get(version_key(pk)) or invalidate_reserved_periods(pk)
+        for pk in listing_ids
+    }
+
+
+def query_reserved_periods(listing_ids, date_from, date_to):
+    '''Периоды занятости для набора объявлений одним запросом'''
+    bookings = Booking.objects.filter(
+        listing_id__in=listing_ids,
+        status=BookingStatus.CONFIRMED,
+        check_in_date__lt=date_to,
+        check_out_date__gt=date_from
+    ).order_by('listing_id', 'check_in_date').values_list(
+        'listing_id', 'check_in_date', 'check_out_date'
+    )
+    periods = defaultdict(list)
+    for listing_id, check_in, check_out in bookings:
+        periods[listing_id].append(
+            (max(check_in, date_from), min(check_out, date_to))
+        )
+    return {pk: merge_periods(periods[pk]) for pk in listing_ids}
+
+
+def get_reserved_periods_bulk(listing_ids, date_from, date_to):
+    '''
+    Объединенные периоды занятости объявлений в окне: из кеша,
+    недостающие - одним запросом к Booking
+    '''
+    window = f'{date_from.isoformat()}:{date_to.isoformat()}'
+    keys = {
+        pk: f'listing-calendar:{pk}:{version}:{window}'
+        for pk, version in get_versions(listing_ids).items()
+    }
+    cache = get_cache()
+    cached = cache.get_many(keys.values())
+    result = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in listing_ids if pk not in result]
+    if missing:
+        fresh = query_reserved_periods(missing, date_from, date_to)
+        cache.set_many(
+            {keys[pk]: periods for pk, periods in fresh.items()},
+            cache_timeout(settings.LISTING_CALENDAR_CACHE_TIMEOUT)
+        )
+        result.update(fresh)
+    return result
+
+
+def get_reserved_periods(listing_id, date_from, date_to):
+    '''Объединенные периоды занятости объявления в окне (из кеша)'''
+    return get_reserved_periods_bulk(
+        [listing_id], date_from, date_to
+    )[listing_id]
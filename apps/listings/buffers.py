@@ -0,0 +1,236 @@
+'''
+Буферы отложенной записи (write-behind): события копятся в памяти
+процесса и сохраняются пачками - по таймеру, при переполнении буфера
+и при завершении воркера (atexit).
+'''
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction, IntegrityError
+from django.db.models import Case, When, Value, F
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from apps.listings.models import (
+    Listing,
+    ViewHistory,
+    SearchHistory,
+    SearchTermStats
+)
+from apps.utils import get_client_ip
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    '''
+    Потокобезопасный буфер событий. Наследники задают
+    settings_name (словарь MAX_SIZE / FLUSH_INTERVAL в settings),
+    add() и persist()
+    '''
+    settings_name = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = self.empty()
+        self.timer = None
+        self.stopped = threading.Event()
+        atexit.register(self.stop)
+
+    @property
+    def options(self):
+        return getattr(settings, self.settings_name)
+
+    def empty(self):
+        return []
+
+    def add(self, item):
+        self.items.append(item)
+
+    def persist(self, items):
+        raise NotImplementedError
+
+    def record(self, item):
+        with self.lock:
+            self.add(item)
+            overflow = len(self.items) >= self.options['MAX_SIZE']
+            if self.timer is None:
+                self.start_timer()
+        if overflow:
+            self.flush()
+
+    def flush(self):
+        '''Сохранить накопленные события, возвращает их количество'''
+        with self.lock:
+            items, self.items = self.items, self.empty()
+        if not items:
+            return 0
+        try:
+            self.persist(items)
+        except Exception:
+            logger.exception(
+                '%s: %d events lost', type(self).__name__, len(items)
+            )
+            return 0
+        return len(items)
+
+    def start_timer(self):
+        interval = self.options['FLUSH_INTERVAL']
+        if not interval:
+            return
+        self.timer = threading.Thread(
+            target=self.run,
+            args=(interval,),
+            name=type(self).__name__,
+            daemon=True
+        )
+        self.timer.start()
+
+    def run(self, interval):
+        while not self.stopped.wait(interval):
+            self.flush()
+            # У потока таймера собственное соединение с БД
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.flush()
+
+
+class ViewBuffer(WriteBehindBuffer):
+    '''
+    Просмотры объявлений: {(listing_id, user_id), ...}.
+    Новые пары вставляются в ViewHistory, у существующих обновляется
+    viewed_at; number_of_views = number_of_views + N одним UPDATE
+    по фактически вставленным строкам (без Listing.save() и без
+    изменения updated_at)
+    '''
+    settings_name = 'LISTING_VIEW_BUFFER'
+
+    def empty(self):
+        return set()
+
+    def add(self, item):
+        self.items.add(item)
+
+    def existing_views(self, items):
+        return set(ViewHistory.objects.filter(
+            listing_id__in={listing_id for listing_id, _ in items},
+            user_id__in={user_id for _, user_id in items}
+        ).values_list('listing_id', 'user_id'))
+
+    def insert_views(self, pairs):
+        '''
+        Вставка новых пар без игнорирования конфликтов, возвращает
+        вставленные. Пару мог одновременно вставить другой воркер -
+        тогда вставка по одной, чтобы не учесть просмотр дважды
+        '''
+        views = [
+            ViewHistory(listing_id=listing_id, user_id=user_id)
+            for listing_id, user_id in pairs
+        ]
+        try:
+            with transaction.atomic():
+                ViewHistory.objects.bulk_create(views)
+            return set(pairs)
+        except IntegrityError:
+            pass
+        inserted = set()
+        for view in views:
+            try:
+                with transaction.atomic():
+                    view.save(force_insert=True)
+            except IntegrityError:
+                continue
+            inserted.add((view.listing_id, view.user_id))
+        return inserted
+
+    def persist(self, items):
+        with transaction.atomic():
+            new = items - self.existing_views(items)
+            inserted = self.insert_views(new) if new else set()
+            seen = items - inserted
+            if seen:
+                # MySQL не поддерживает явное указание unique_fields
+                unique_fields = (
+                    ['listing', 'user']
+                    if connection.features.supports_update_conflicts_with_target
+                    else None
+                )
+                ViewHistory.objects.bulk_create(
+                    [
+                        ViewHistory(listing_id=listing_id, user_id=user_id)
+                        for listing_id, user_id in seen
+                    ],
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=['viewed_at']
+                )
+            new_views = Counter(listing_id for listing_id, _ in inserted)
+            if new_views:
+                Listing.objects.filter(pk__in=new_views).update(
+                    number_of_views=F('number_of_views') + Case(
+                        *[
+                            When(pk=listing_id, then=Value(count))
+                            for listing_id, count in new_views.items()
+                        ],
+                        default=Value(0)
+                    )
+                )
+
+
+class SearchLogBuffer(WriteBehindBuffer):
+    '''
+    Поисковые запросы, в том числе анонимные (по хешу сессии или IP).
+    Сохраняются в SearchHistory одним bulk_create,
+    попутно обновляются счетчики SearchTermStats
+    '''
+    settings_name = 'LISTING_SEARCH_LOG_BUFFER'
+
+    def __init__(self):
+        super().__init__()
+        self.pruned_at = None
+
+    def log(self, request, term):
+        user = request.user
+        if user.is_authenticated:
+            self.record(SearchHistory(user_id=user.pk, term=term[:255]))
+            return
+        session = getattr(request, 'session', None)
+        key = (
+            session.session_key if session and session.session_key
+            else get_client_ip(request)
+        )
+        visitor = salted_hmac('search-visitor', key).hexdigest()
+        self.record(SearchHistory(visitor=visitor, term=term[:255]))
+
+    def persist(self, items):
+        with transaction.atomic():
+            SearchHistory.objects.bulk_create(items)
+            SearchTermStats.add_searches(
+                (search.term, search.searched_at) for search in items
+            )
+        self.prune()
+
+    def prune(self):
+        '''
+        Удаление устаревших часовых и дневных счетчиков не чаще
+        раза в LISTING_SEARCH_STATS_PRUNE_INTERVAL секунд
+        '''
+        now = timezone.now()
+        interval = timedelta(
+            seconds=settings.LISTING_SEARCH_STATS_PRUNE_INTERVAL
+        )
+        if self.pruned_at and now - self.pruned_at < interval:
+            return
+        self.pruned_at = now
+        SearchTermStats.prune(now)
+
+
+view_buffer = ViewBuffer()
+search_log = SearchLogBuffer()
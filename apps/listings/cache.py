@@ -0,0 +1,130 @@
+'''
+Кеширование ответов по нормализованным параметрам запроса:
+одинаковые по смыслу запросы (порядок параметров, 100 и 100.00,
+регистр поисковых слов) попадают в один ключ кеша.
+В ключ входит версия данных объявлений (сменяется сигналами при
+сохранении/удалении Listing) и, для фильтра по свободным датам,
+версия бронирований.
+
+Все кеши объявлений (ответы, фасеты, календари) хранятся в кеше
+settings.LISTINGS_CACHE. Версии сбрасываются только в этом кеше:
+если он общий (Redis, dbcache), сброс сразу виден всем воркерам.
+В кеше процесса (locmem) другие воркеры сброса не видят, поэтому время
+жизни записей ограничено LISTINGS_LOCAL_CACHE_TIMEOUT секундами -
+это и есть максимальная задержка обновления данных
+'''
+import hashlib
+import time
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# Параметры, которые не влияют на результат
+IGNORED_PARAMS = {'format'}
+LISTINGS_VERSION_KEY = 'listings-version'
+AVAILABILITY_VERSION_KEY = 'listings-availability-version'
+AVAILABILITY_PARAMS = {'available_from', 'available_to'}
+
+
+def get_cache():
+    return caches[settings.LISTINGS_CACHE]
+
+
+def cache_timeout(timeout):
+    '''Время жизни записи с учетом кеша процесса (см. выше)'''
+    if isinstance(get_cache(), LocMemCache):
+        return min(timeout, settings.LISTINGS_LOCAL_CACHE_TIMEOUT)
+    return timeout
+
+
+def bump_version(key):
+    version = time.time_ns()
+    get_cache().set(key, version, None)
+    return version
+
+
+def get_version(key):
+    return get_cache().get(key) or bump_version(key)
+
+
+def invalidate_listings():
+    bump_version(LISTINGS_VERSION_KEY)
+
+
+def invalidate_availability():
+    bump_version(AVAILABILITY_VERSION_KEY)
+
+
+def normalize_value(key, value):
+    value = ' '.join(value.split())
+    # Поиск и icontains не зависят от регистра
+    if key == 'search' or key.endswith('__icontains'):
+        return value.lower()
+    parts = []
+    for part in value.split(','):
+        try:
+            number = Decimal(part)
+        except InvalidOperation:
+            parts.append(part)
+            continue
+        if number.is_finite():
+            part = format(number.normalize(), 'f')
+        parts.append(part)
+    return ','.join(parts)
+
+
+def normalize_query(query_params, ignore=()):
+    '''Отсортированные пары (параметр, значение) без пустых значений'''
+    ignore = IGNORED_PARAMS | set(ignore)
+    return sorted(
+        (key, normalize_value(key, value))
+        for key, values in query_params.lists()
+        if key not in ignore
+        for value in values
+        if value.strip()
+    )
+
+
+def query_cache_key(prefix, query_params, ignore=()):
+    query = normalize_query(query_params, ignore)
+    version = get_version(LISTINGS_VERSION_KEY)
+    if any(key in AVAILABILITY_PARAMS for key, _ in query):
+        version = f'{version}.{get_version(AVAILABILITY_VERSION_KEY)}'
+    digest = hashlib.md5(urlencode(query).encode()).hexdigest()
+    return f'{prefix}:{version}:{digest}'
+
+
+class CacheStats:
+    '''Счетчики попаданий и промахов кеша (в самом кеше)'''
+    def __init__(self, prefix):
+        self.keys = {
+            'hits': f'{prefix}:hits',
+            'misses': f'{prefix}:misses'
+        }
+
+    def count(self, name):
+        key = self.keys[name]
+        cache = get_cache()
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+    def hit(self):
+        self.count('hits')
+
+    def miss(self):
+        self.count('misses')
+
+    def get(self):
+        counts = get_cache().get_many(self.keys.values())
+        stats = {
+            name: counts.get(key, 0) for name, key in self.keys.items()
+        }
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+        return stats
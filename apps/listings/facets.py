@@ -0,0 +1,79 @@
+'''
+Фасеты страницы поиска: количество объявлений по типу жилья,
+количеству комнат и диапазону цены для текущего набора фильтров,
+все счетчики - одним агрегирующим запросом
+'''
+from django.db.models import Count, Q
+
+from apps.listings.models import PropertyType
+
+
+# (подпись, минимум, максимум) - максимум не включается,
+# None - без ограничения (rooms = 0 попадает в первую группу)
+ROOMS_BUCKETS = [
+    ('0-1', None, 2),
+    ('2', 2, 3),
+    ('3', 3, 4),
+    ('4+', 4, None),
+]
+PRICE_BANDS = [
+    ('0-50', None, 50),
+    ('50-100', 50, 100),
+    ('100-200', 100, 200),
+    ('200+', 200, None),
+]
+
+
+def range_filter(field, minimum, maximum):
+    condition = Q()
+    if minimum is not None:
+        condition &= Q(**{f'{field}__gte': minimum})
+    if maximum is not None:
+        condition &= Q(**{f'{field}__lt': maximum})
+    return condition
+
+
+def count_facets(queryset):
+    aggregates = {'total': Count('id')}
+    for value, _ in PropertyType.choices:
+        aggregates[f'property_type_{value}'] = Count(
+            'id', filter=Q(property_type=value)
+        )
+    for index, (_, minimum, maximum) in enumerate(ROOMS_BUCKETS):
+        aggregates[f'rooms_{index}'] = Count(
+            'id', filter=range_filter('rooms', minimum, maximum)
+        )
+    for index, (_, minimum, maximum) in enumerate(PRICE_BANDS):
+        aggregates[f'price_{index}'] = Count(
+            'id', filter=range_filter('price', minimum, maximum)
+        )
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        'total': counts['total'],
+        'property_type': [
+            {
+                'id': value,
+                'name': name,
+                'count': counts[f'property_type_{value}']
+            }
+            for value, name in PropertyType.choices
+        ],
+        'rooms': [
+            {
+                'label': label,
+                'min': minimum,
+                'max': maximum,
+                'count': counts[f'rooms_{index}']
+            }
+            for index, (label, minimum, maximum) in enumerate(ROOMS_BUCKETS)
+        ],
+        'price': [
+            {
+                'label': label,
+                'min': minimum,
+                'max': maximum,
+                'count': counts[f'price_{index}']
+            }
+            for index, (label, minimum, maximum) in enumerate(PRICE_BANDS)
+        ],
+    }
@@ -1,28 +1,108 @@
+from datetime import timedelta
+from django import forms
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework as django_filters
 from rest_framework import filters
-from django.db.models import Q
 
-from apps.listings.models import SearchHistory
+from apps.listings.models import Listing
+from apps.listings.buffers import search_log
+from apps.listings.search import get_search_backend
+from apps.bookings.models import BookingStatus, Booking
+
+
+class ListingFilterForm(forms.Form):
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('available_from')
+        date_to = cleaned_data.get('available_to')
+        if date_from and date_to and date_from >= date_to:
+            raise forms.ValidationError(
+                'The available_from date must be before available_to.'
+            )
+        return cleaned_data
+
+
+class ListingFilter(django_filters.FilterSet):
+    # Свободно на период (возможность указать даты заезда и выезда)
+    available_from = django_filters.DateFilter(method='filter_available')
+    available_to = django_filters.DateFilter(method='filter_available')
+
+    class Meta:
+        model = Listing
+        form = ListingFilterForm
+        # https://docs.djangoproject.com/en/5.1/ref/models/querysets/#field-lookups
+        fields = {
+            # Цена (возможность указать минимальную и максимальную цену)
+            'price': ['lte', 'gte'],
+            # Количество комнат (возможность указать диапазон количества
+            # комнат)
+            'rooms': ['range'],
+            # Тип жилья (возможность выбрать тип жилья квартира,
+            # дом, студия и т.д.)
+            'property_type': ['exact'],
+            # Местоположение: (возможность указать город или район
+            # в Германии)
+            'address': ['icontains']
+        }
+
+    def filter_available(self, queryset, name, value):
+        '''
+        Исключаем объявления с подтвержденными бронированиями,
+        пересекающими период [available_from, available_to)
+        одним запросом NOT EXISTS (индекс booking_listing_dates_idx).
+        Если задана только одна граница, период - одна ночь.
+        '''
+        date_from = self.form.cleaned_data.get('available_from')
+        date_to = self.form.cleaned_data.get('available_to')
+        if name == 'available_to' and date_from:
+            # Период уже учтен при обработке available_from
+            return queryset
+        if date_from is None:
+            date_from = date_to - timedelta(days=1)
+        if date_to is None:
+            date_to = date_from + timedelta(days=1)
+        overlapping_bookings = Booking.objects.filter(
+            listing=OuterRef('pk'),
+            status=BookingStatus.CONFIRMED,
+            check_in_date__lt=date_to,
+            check_out_date__gt=date_from
+        )
+        return queryset.filter(~Exists(overlapping_bookings))
 
 
 class CustomSearchFilter(filters.SearchFilter):
     '''
-    Проверяем icontains каждого слова отдельно, что-то вроде:
-    WHERE field LIKE '%term%' OR field LIKE '%term%' OR ...
+    Ищем объявления, содержащие все слова (AND, по префиксу), через
+    поисковый движок (listings.search.py) вместо полного сканирования
+    таблицы по LIKE '%term%'. Результат аннотирован полем search_rank.
     '''
     def filter_queryset(self, request, queryset, view):
         search_fields = self.get_search_fields(view, request)
         search_terms = self.get_search_terms(request)
         if search_terms:
-            SearchHistory.objects.create(
-                user=request.user,
-                term=' '.join(search_terms)
-            )
+            self.log_search(request, view, search_terms)
             if search_fields:
-                query = Q()
-                for term in search_terms:
-                    term_query = Q()
-                    for field in search_fields:
-                        term_query |= Q(**{f"{field}__icontains": term})
-                    query |= term_query
-                return queryset.filter(query)
+                return get_search_backend().search(queryset, search_terms)
         return super().filter_queryset(request, queryset, view)
+
+    def log_search(self, request, view, search_terms=None):
+        '''
+        Запись в историю поиска - отложенно, пачками;
+        вспомогательные запросы (facets) не учитываются
+        '''
+        if search_terms is None:
+            search_terms = self.get_search_terms(request)
+        if search_terms and getattr(view, 'action', 'list') == 'list':
+            search_log.log(request, ' '.join(search_terms))
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    '''
+    Если сортировка не задана явно, результаты поиска
+    сортируются по релевантности (search_rank)
+    '''
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', 'id']
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.listings.models import SearchTermStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Удалить часовые и дневные счетчики поисковых запросов '
+        'за пределами окон статистики (24 часа и 7 дней)'
+    )
+
+    def handle(self, *args, **options):
+        deleted = SearchTermStats.prune(timezone.now())
+        self.stdout.write(f'{deleted} outdated search stats deleted.')
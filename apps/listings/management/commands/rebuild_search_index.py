@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.listings.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестроить поисковый индекс объявлений'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(
+            f'Search index rebuilt ({type(backend).__name__}).'
+        )
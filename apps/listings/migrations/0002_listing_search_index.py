@@ -0,0 +1,50 @@
+from django.db import migrations, OperationalError
+
+
+FTS_TABLE = 'listings_listing_fts'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE {FTS_TABLE} '
+                    f'USING fts5(title, description)'
+                )
+            except OperationalError:
+                # SQLite собран без FTS5 - будет использован
+                # InvertedIndexSearchBackend
+                return
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+                f'SELECT id, title, COALESCE(description, \'\') '
+                f'FROM listings_listing'
+            )
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE listings_listing ADD FULLTEXT INDEX '
+            'listings_listing_fulltext (title, description)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE listings_listing DROP INDEX listings_listing_fulltext'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
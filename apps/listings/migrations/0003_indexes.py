@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_listing_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'price'], name='listing_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'property_type', 'price'], name='listing_active_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'rooms'], name='listing_active_rooms_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'created_at'], name='listing_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'rating'], name='listing_active_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'number_of_reviews'], name='listing_active_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'number_of_views'], name='listing_active_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['owner', 'updated_at'], name='listing_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['user', 'searched_at'], name='search_user_searched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['term'], name='search_term_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewhistory',
+            index=models.Index(fields=['user', 'viewed_at'], name='viewhistory_user_viewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewhistory',
+            index=models.Index(fields=['listing', 'user'], name='viewhistory_listing_user_idx'),
+        ),
+    ]
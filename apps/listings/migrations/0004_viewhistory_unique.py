@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:39
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_views(apps, schema_editor):
+    # Оставляем последнюю запись для каждой пары (listing, user)
+    ViewHistory = apps.get_model('listings', 'ViewHistory')
+    duplicates = (
+        ViewHistory.objects
+        .values('listing', 'user')
+        .annotate(count=Count('id'), last_id=Max('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        ViewHistory.objects.filter(
+            listing=duplicate['listing'],
+            user=duplicate['user']
+        ).exclude(id=duplicate['last_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_views, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='viewhistory',
+            name='viewhistory_listing_user_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='viewhistory',
+            constraint=models.UniqueConstraint(fields=('listing', 'user'), name='viewhistory_listing_user_unique'),
+        ),
+    ]
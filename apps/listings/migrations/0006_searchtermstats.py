@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+from collections import Counter
+from datetime import datetime, timezone
+from django.db import migrations, models
+
+
+def fill_search_term_stats(apps, schema_editor):
+    # Перенос накопленной истории поиска в счетчики
+    SearchHistory = apps.get_model('listings', 'SearchHistory')
+    SearchTermStats = apps.get_model('listings', 'SearchTermStats')
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    counts = Counter()
+    history = SearchHistory.objects.values_list('term', 'searched_at')
+    for term, searched_at in history.iterator():
+        term = ' '.join(term.lower().split())[:255]
+        hour = searched_at.astimezone(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        counts[(0, hour, term)] += 1
+        counts[(1, hour.replace(hour=0), term)] += 1
+        counts[(2, epoch, term)] += 1
+    SearchTermStats.objects.bulk_create(
+        [
+            SearchTermStats(
+                period=period, bucket=bucket, term=term, total_searches=total
+            )
+            for (period, bucket, term), total in counts.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_searchhistory_visitor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTermStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=255)),
+                ('period', models.IntegerField(choices=[(0, 'Hour'), (1, 'Day'), (2, 'All time')])),
+                ('bucket', models.DateTimeField()),
+                ('total_searches', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'bucket', '-total_searches'], name='searchstats_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'term'), name='searchstats_bucket_term_unique')],
+            },
+        ),
+        migrations.RunPython(
+            fill_search_term_stats, migrations.RunPython.noop
+        ),
+    ]
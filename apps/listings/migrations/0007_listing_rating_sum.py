@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:47
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def fill_rating_sum(apps, schema_editor):
+    # Сумма и количество оценок по существующим отзывам
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('reviews', 'Review')
+    reviews = Review.objects.filter(
+        listing=OuterRef('pk')
+    ).order_by().values('listing')
+    Listing.objects.update(
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+            0
+        ),
+        number_of_reviews=Coalesce(
+            Subquery(reviews.annotate(total=Count('id')).values('total')),
+            0
+        )
+    )
+    Listing.objects.update(
+        rating=Coalesce(
+            Cast(F('rating_sum'), models.FloatField())
+            / NullIf(F('number_of_reviews'), 0),
+            0.0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_searchtermstats'),
+        ('reviews', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_distribution(apps, schema_editor):
+    # Количество существующих отзывов по оценкам
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('reviews', 'Review')
+    reviews = Review.objects.filter(
+        listing=OuterRef('pk')
+    ).order_by().values('listing')
+    Listing.objects.update(**{
+        f'rating_{rating}_count': Coalesce(
+            Subquery(
+                reviews.filter(rating=rating).annotate(
+                    total=Count('id')
+                ).values('total')
+            ),
+            0
+        )
+        for rating in range(6)
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listing_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rating_0_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_1_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_2_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_3_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_4_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_5_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(
+            fill_rating_distribution, migrations.RunPython.noop
+        ),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 
@@ -37,35 +40,168 @@ class Listing(models.Model):
     rating = models.FloatField(default=0.0)
     number_of_reviews = models.IntegerField(default=0)
     number_of_views = models.IntegerField(default=0)
+    # Сумма оценок: rating = rating_sum / number_of_reviews
+    rating_sum = models.IntegerField(default=0)
+    # Распределение оценок: количество отзывов с оценкой 0..5
+    rating_0_count = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+
+    RATING_VALUES = range(6)
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['-updated_at']
+        # Фильтр списка всегда по is_active, дальше - поле сортировки
+        # или фильтра (id добавляется к индексу неявно)
+        indexes = [
+            models.Index(
+                fields=['is_active', 'price'],
+                name='listing_active_price_idx'
+            ),
+            models.Index(
+                fields=['is_active', 'property_type', 'price'],
+                name='listing_active_type_price_idx'
+            ),
+            models.Index(
+                fields=['is_active', 'rooms'],
+                name='listing_active_rooms_idx'
+            ),
+            models.Index(
+                fields=['is_active', 'created_at'],
+                name='listing_active_created_idx'
+            ),
+            models.Index(
+                fields=['is_active', 'rating'],
+                name='listing_active_rating_idx'
+            ),
+            models.Index(
+                fields=['is_active', 'number_of_reviews'],
+                name='listing_active_reviews_idx'
+            ),
+            models.Index(
+                fields=['is_active', 'number_of_views'],
+                name='listing_active_views_idx'
+            ),
+            models.Index(
+                fields=['owner', 'updated_at'],
+                name='listing_owner_updated_idx'
+            ),
+        ]
 
     def update_views(self):
         '''
-        Обновление счетчика просмотров объявления
-        use in ListingViewSet.retrieve (listings.views.py)
+        Пересчет счетчика просмотров объявления по истории просмотров.
+        В обычном режиме счетчик увеличивает ViewBuffer
+        (listings.buffers.py), пересчет нужен только для восстановления
         '''
         self.number_of_views = self.view_history.count()
-        self.save()
+        Listing.objects.filter(pk=self.pk).update(
+            number_of_views=self.number_of_views
+        )
 
-    def update_rating(self):
+    @staticmethod
+    def lock_rows(queryset):
+        '''
+        Блокировка строк объявлений до конца транзакции
+        (SELECT ... FOR UPDATE в порядке id), возвращает их id.
+        SQLite не поддерживает FOR UPDATE: пустой UPDATE сразу берет
+        блокировку записи БД (с ожиданием OPTIONS['timeout']), то есть
+        IMMEDIATE только для транзакций, которым она нужна
+        '''
+        queryset = queryset.order_by('pk')
+        if connection.features.has_select_for_update:
+            queryset = queryset.select_for_update()
+        else:
+            queryset.update(id=models.F('id'))
+        return list(queryset.values_list('pk', flat=True))
+
+    @staticmethod
+    def rating_expression(rating_sum, number_of_reviews):
+        '''rating = rating_sum / number_of_reviews (0.0 без отзывов)'''
+        return Coalesce(
+            Cast(rating_sum, models.FloatField())
+            / NullIf(number_of_reviews, 0),
+            0.0
+        )
+
+    @staticmethod
+    def rating_count_field(rating):
+        return f'rating_{rating}_count'
+
+    @classmethod
+    def add_rating(cls, listing_id, added=None, removed=None):
         '''
-        Обновление рейтинга и счетчика отзывов
+        Инкрементальное обновление рейтинга и распределения оценок
+        одним UPDATE (без save() и без изменения updated_at):
+        added - оценка нового отзыва, removed - удаленного,
+        обе - при изменении оценки.
         use in signals (reviews.signals.py):
             update_listing_rating_on_save
             update_listing_rating_on_delete
         '''
+        ratings = Counter()
+        if added is not None:
+            ratings[added] += 1
+        if removed is not None:
+            ratings[removed] -= 1
+        rating_sum = models.F('rating_sum') + ((added or 0) - (removed or 0))
+        number_of_reviews = models.F('number_of_reviews') + sum(
+            ratings.values()
+        )
+        cls.objects.filter(pk=listing_id).update(
+            # rating - первым: MySQL вычисляет SET слева направо,
+            # подставляя уже обновленные значения столбцов
+            rating=cls.rating_expression(rating_sum, number_of_reviews),
+            rating_sum=rating_sum,
+            number_of_reviews=number_of_reviews,
+            **{
+                cls.rating_count_field(rating): (
+                    models.F(cls.rating_count_field(rating)) + count
+                )
+                for rating, count in ratings.items() if count
+            }
+        )
+
+    def rating_distribution(self):
+        '''Количество отзывов по оценкам, от 5 до 0'''
+        return [
+            {
+                'rating': rating,
+                'count': getattr(self, self.rating_count_field(rating))
+            }
+            for rating in reversed(self.RATING_VALUES)
+        ]
+
+    def update_rating(self):
+        '''
+        Пересчет рейтинга и счетчика отзывов по всем отзывам.
+        В обычном режиме рейтинг обновляет add_rating,
+        пересчет нужен только для восстановления
+        '''
         reviews = self.reviews.aggregate(
-            rating=models.Avg('rating'),
-            number_of_reviews=models.Count('id')
+            rating_sum=models.Sum('rating'),
+            number_of_reviews=models.Count('id'),
+            **{
+                self.rating_count_field(rating): models.Count(
+                    'id', filter=models.Q(rating=rating)
+                )
+                for rating in self.RATING_VALUES
+            }
+        )
+        reviews['rating_sum'] = reviews['rating_sum'] or 0
+        reviews['rating'] = (
+            reviews['rating_sum'] / reviews['number_of_reviews']
+            if reviews['number_of_reviews'] else 0.0
         )
-        self.rating = reviews['rating'] or 0.0
-        self.number_of_reviews = reviews['number_of_reviews']
-        self.save()
+        for field, value in reviews.items():
+            setattr(self, field, value)
+        Listing.objects.filter(pk=self.pk).update(**reviews)
 
 
 class ViewHistory(models.Model):
@@ -86,6 +222,18 @@ class ViewHistory(models.Model):
 
     class Meta:
         ordering = ['-viewed_at']
+        indexes = [
+            models.Index(
+                fields=['user', 'viewed_at'],
+                name='viewhistory_user_viewed_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['listing', 'user'],
+                name='viewhistory_listing_user_unique'
+            ),
+        ]
 
 
 class SearchHistory(models.Model):
@@ -93,12 +241,132 @@ class SearchHistory(models.Model):
         to=User,
         on_delete=models.CASCADE,
         related_name='search_history',
+        blank=True,
+        null=True
     )
+    # Хеш сессии или IP анонимного пользователя
+    visitor = models.CharField(max_length=64, blank=True, default='')
     term = models.CharField(max_length=255)
     searched_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'{self.user} searched {self.term}'
+        return f'{self.user or self.visitor} searched {self.term}'
 
     class Meta:
         ordering = ['-searched_at']
+        indexes = [
+            models.Index(
+                fields=['user', 'searched_at'],
+                name='search_user_searched_idx'
+            ),
+            models.Index(
+                fields=['term'],
+                name='search_term_idx'
+            ),
+        ]
+
+
+class StatsPeriod(models.IntegerChoices):
+    HOUR = 0, _('Hour')
+    DAY = 1, _('Day')
+    ALL = 2, _('All time')
+
+
+class SearchTermStats(models.Model):
+    '''
+    Счетчики поисковых запросов по часам, дням и за все время.
+    Обновляются инкрементально при сохранении истории поиска
+    (SearchLogBuffer, listings.buffers.py)
+    '''
+    # Начало периода all time
+    EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    # Окна статистики (search_stats): 24 часа и 7 дней, включая
+    # текущий час/день. Более старые счетчики удаляются (prune)
+    WINDOWS = {
+        StatsPeriod.HOUR: timedelta(hours=23),
+        StatsPeriod.DAY: timedelta(days=6),
+    }
+
+    term = models.CharField(max_length=255)
+    period = models.IntegerField(choices=StatsPeriod.choices)
+    bucket = models.DateTimeField()
+    total_searches = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.term}: {self.total_searches}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket', 'term'],
+                name='searchstats_bucket_term_unique'
+            ),
+        ]
+        indexes = [
+            # Топ запросов за все время
+            models.Index(
+                fields=['period', 'bucket', '-total_searches'],
+                name='searchstats_top_idx'
+            ),
+        ]
+
+    @staticmethod
+    def normalize_term(term):
+        return ' '.join(term.lower().split())[:255]
+
+    @classmethod
+    def buckets(cls, searched_at):
+        hour = searched_at.astimezone(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        return [
+            (StatsPeriod.HOUR, hour),
+            (StatsPeriod.DAY, hour.replace(hour=0)),
+            (StatsPeriod.ALL, cls.EPOCH),
+        ]
+
+    @classmethod
+    def window_start(cls, period, now):
+        '''Первый счетчик периода в окне WINDOWS, заканчивающемся now'''
+        return dict(cls.buckets(now - cls.WINDOWS[period]))[period]
+
+    @classmethod
+    def prune(cls, now):
+        '''
+        Удаление часовых и дневных счетчиков за пределами окон WINDOWS,
+        возвращает число удаленных строк
+        '''
+        deleted = 0
+        for period in cls.WINDOWS:
+            deleted += cls.objects.filter(
+                period=period,
+                bucket__lt=cls.window_start(period, now)
+            ).delete()[0]
+        return deleted
+
+    @classmethod
+    def add_searches(cls, searches):
+        '''
+        Учет пачки поисковых запросов [(term, searched_at), ...]:
+        одно атомарное UPDATE (F) на каждый затронутый счетчик
+        '''
+        counts = Counter()
+        for term, searched_at in searches:
+            term = cls.normalize_term(term)
+            for period, bucket in cls.buckets(searched_at):
+                counts[(period, bucket, term)] += 1
+        for (period, bucket, term), count in counts.items():
+            stats = cls.objects.filter(period=period, bucket=bucket, term=term)
+            if stats.update(total_searches=models.F('total_searches') + count):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        period=period,
+                        bucket=bucket,
+                        term=term,
+                        total_searches=count
+                    )
+            except IntegrityError:
+                # Счетчик успел создать другой процесс
+                stats.update(total_searches=models.F('total_searches') + count)
@@ -0,0 +1,273 @@
+'''
+Поисковые движки для объявлений.
+
+CustomSearchFilter (listings.filters.py) не строит LIKE '%term%' по
+каждому слову, а делегирует поиск движку из settings.LISTING_SEARCH_BACKEND:
+    'auto'  - SQLite FTS5 или MySQL FULLTEXT в зависимости от БД,
+              иначе инвертированный индекс в памяти процесса
+    'apps.listings.search.SQLiteFTSSearchBackend'
+    'apps.listings.search.MySQLFullTextSearchBackend'
+    'apps.listings.search.InvertedIndexSearchBackend'
+
+Движок фильтрует queryset и аннотирует его полем search_rank
+(чем больше, тем релевантнее), поэтому результат по-прежнему
+комбинируется с DjangoFilterBackend и OrderingFilter.
+'''
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from math import log
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, When, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    '''Разбиение текста на слова в нижнем регистре'''
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+class BaseSearchBackend:
+    def search(self, queryset, terms):
+        '''
+        Вернуть queryset с объявлениями, содержащими все слова
+        terms (по префиксу), аннотированный полем search_rank
+        '''
+        raise NotImplementedError
+
+    def index_listing(self, listing):
+        '''Добавить или обновить объявление в индексе'''
+
+    def remove_listing(self, listing_id):
+        '''Удалить объявление из индекса'''
+
+    def rebuild(self):
+        '''Перестроить индекс по всем объявлениям'''
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    '''
+    Полнотекстовый поиск через виртуальную таблицу FTS5
+    (создается миграцией listings.0002_listing_search_index).
+    Слова ищутся по префиксу, релевантность - bm25.
+    '''
+    table = 'listings_listing_fts'
+
+    def match_expression(self, terms):
+        tokens = [token for term in terms for token in tokenize(term)]
+        return ' AND '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, queryset, terms):
+        match = self.match_expression(terms)
+        if not match:
+            return queryset.none()
+        listing_table = queryset.model._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s',
+                [match]
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({self.table}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                f'AND rowid = {listing_table}.id',
+                [match],
+                output_field=FloatField()
+            )
+        )
+
+    def index_listing(self, listing):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {self.table} '
+                f'(rowid, title, description) VALUES (%s, %s, %s)',
+                [listing.pk, listing.title, listing.description or '']
+            )
+
+    def remove_listing(self, listing_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [listing_id]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description) '
+                f'SELECT id, title, COALESCE(description, \'\') '
+                f'FROM listings_listing'
+            )
+
+
+class MySQLFullTextSearchBackend(BaseSearchBackend):
+    '''
+    Полнотекстовый поиск через FULLTEXT индекс (title, description)
+    (создается миграцией listings.0002_listing_search_index).
+    Индекс поддерживается самим MySQL, синхронизация не нужна.
+    '''
+    def search(self, queryset, terms):
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return queryset.none()
+        listing_table = queryset.model._meta.db_table
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f'MATCH ({listing_table}.title, {listing_table}.description) '
+                f'AGAINST (%s IN BOOLEAN MODE)',
+                [' '.join(f'+{token}*' for token in tokens)],
+                output_field=FloatField()
+            )
+        ).filter(search_rank__gt=0)
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    '''
+    Инвертированный индекс в памяти процесса (TF-IDF), запасной
+    вариант для БД без полнотекстового поиска.
+    Индекс строится при первом поиске и обновляется сигналами
+    только в текущем процессе, поэтому при нескольких воркерах
+    его стоит периодически перестраивать (rebuild_search_index).
+    '''
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = None
+        self.documents = {}
+        self.vocabulary = []
+
+    def ensure_loaded(self):
+        if self.postings is None:
+            self.rebuild()
+
+    def rebuild(self):
+        from apps.listings.models import Listing
+        with self.lock:
+            self.postings = defaultdict(dict)
+            self.documents = {}
+            listings = Listing.objects.values_list(
+                'id', 'title', 'description'
+            )
+            for listing_id, title, description in listings.iterator():
+                self.add_document(listing_id, title, description)
+            self.vocabulary = sorted(self.postings)
+
+    def add_document(self, listing_id, title, description):
+        tokens = tokenize(title) + tokenize(description)
+        self.documents[listing_id] = set(tokens)
+        for token in tokens:
+            postings = self.postings[token]
+            postings[listing_id] = postings.get(listing_id, 0) + 1
+
+    def remove_document(self, listing_id):
+        for token in self.documents.pop(listing_id, ()):
+            postings = self.postings[token]
+            postings.pop(listing_id, None)
+            if not postings:
+                del self.postings[token]
+
+    def index_listing(self, listing):
+        with self.lock:
+            if self.postings is None:
+                return
+            self.remove_document(listing.pk)
+            self.add_document(
+                listing.pk, listing.title, listing.description
+            )
+            self.vocabulary = sorted(self.postings)
+
+    def remove_listing(self, listing_id):
+        with self.lock:
+            if self.postings is None:
+                return
+            self.remove_document(listing_id)
+            self.vocabulary = sorted(self.postings)
+
+    def expand_prefix(self, prefix):
+        '''Слова словаря, начинающиеся с prefix (бинарный поиск)'''
+        position = bisect_left(self.vocabulary, prefix)
+        while (
+            position < len(self.vocabulary)
+            and self.vocabulary[position].startswith(prefix)
+        ):
+            yield self.vocabulary[position]
+            position += 1
+
+    def score(self, terms):
+        '''
+        Релевантность объявлений, содержащих каждое слово terms:
+        множества найденных по префиксу документов пересекаются
+        '''
+        self.ensure_loaded()
+        scores = defaultdict(float)
+        matched = None
+        with self.lock:
+            total = len(self.documents) or 1
+            for term in terms:
+                for prefix in tokenize(term):
+                    found = set()
+                    for token in self.expand_prefix(prefix):
+                        postings = self.postings[token]
+                        idf = log(1 + total / len(postings))
+                        for listing_id, frequency in postings.items():
+                            scores[listing_id] += frequency * idf
+                            found.add(listing_id)
+                    matched = found if matched is None else matched & found
+        return {
+            listing_id: score for listing_id, score in scores.items()
+            if listing_id in (matched or ())
+        }
+
+    def search(self, queryset, terms):
+        '''
+        Все найденные объявления; search_rank - только у лучших
+        LISTING_SEARCH_MAX_RANKED (ограничение размера CASE),
+        у остальных 0, поэтому они идут после ранжированных
+        '''
+        scores = self.score(terms)
+        if not scores:
+            return queryset.none()
+        limit = settings.LISTING_SEARCH_MAX_RANKED
+        best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        return queryset.filter(
+            pk__in=list(scores)
+        ).annotate(
+            search_rank=Case(
+                *[
+                    When(pk=listing_id, then=Value(score))
+                    for listing_id, score in best
+                ],
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        )
+
+
+def sqlite_fts_available():
+    return (
+        SQLiteFTSSearchBackend.table
+        in connection.introspection.table_names()
+    )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    '''Движок поиска, выбранный в settings.LISTING_SEARCH_BACKEND'''
+    backend = settings.LISTING_SEARCH_BACKEND
+    if backend != 'auto':
+        return import_string(backend)()
+    if connection.vendor == 'sqlite' and sqlite_fts_available():
+        return SQLiteFTSSearchBackend()
+    if connection.vendor == 'mysql':
+        return MySQLFullTextSearchBackend()
+    return InvertedIndexSearchBackend()
@@ -1,4 +1,7 @@
+from datetime import timedelta
+from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
 
 from apps.users.serializers import UserSerializer
@@ -16,6 +19,48 @@ class ChoicesSerializer(serializers.Serializer):
         }
 
 
+# Поля компактного представления для карточек в списке (?view=card)
+CARD_FIELDS = [
+    'id',
+    'title',
+    'address',
+    'property_type',
+    'property_type_display',
+    'rooms',
+    'price',
+    'rating',
+    'number_of_reviews',
+    'listing_url'
+]
+# Вложенные объекты, которые можно раскрыть через ?expand=
+EXPANDABLE_FIELDS = {'owner'}
+
+
+def split_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def get_requested_fields(request):
+    '''
+    Набор полей из ?fields=a,b,c или ?view=card (None - все поля)
+    и вложенные объекты из ?expand=owner
+    '''
+    if request is None or request.method != 'GET':
+        return None, set()
+    params = request.query_params
+    expand = split_names(params.get('expand', ''))
+    if split_names(params.get('fields', '')):
+        return split_names(params['fields']), expand
+    if params.get('view') == 'card':
+        return set(CARD_FIELDS), expand
+    return None, expand
+
+
+def is_owner_expanded(requested, expand):
+    '''Сериализуется ли owner вложенным объектом (с профилем)'''
+    return requested is None or ('owner' in requested and 'owner' in expand)
+
+
 class ListingSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     is_user_owner = serializers.SerializerMethodField()
@@ -24,7 +69,17 @@ class ListingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Listing
-        fields = '__all__'
+        # Служебные счетчики для расчета рейтинга
+        # (распределение оценок - в rating-summary)
+        exclude = [
+            'rating_sum',
+            'rating_0_count',
+            'rating_1_count',
+            'rating_2_count',
+            'rating_3_count',
+            'rating_4_count',
+            'rating_5_count'
+        ]
         read_only_fields = [
             'id',
             'owner',
@@ -35,10 +90,41 @@ class ListingSerializer(serializers.ModelSerializer):
             'number_of_views'
         ]
 
+    def get_fields(self):
+        '''
+        Sparse fieldsets: только запрошенные поля, owner в виде id,
+        если он не раскрыт через ?expand=owner
+        '''
+        fields = super().get_fields()
+        # Параметры запроса относятся только к корневому списку/объекту
+        if self.root is not self and self.root is not self.parent:
+            return fields
+        requested, expand = get_requested_fields(self.context.get('request'))
+        # Неизвестные имена - ошибка 400, а не молча пропущенные поля
+        unknown = {'expand': expand - EXPANDABLE_FIELDS}
+        if requested is not None:
+            unknown['fields'] = requested - set(fields)
+        for param, names in unknown.items():
+            if names:
+                raise serializers.ValidationError({
+                    param: [f'Unknown fields: {", ".join(sorted(names))}.']
+                })
+        if requested is None:
+            return fields
+        fields = {
+            name: field for name, field in fields.items()
+            if name in requested
+        }
+        if 'owner' in fields and not is_owner_expanded(requested, expand):
+            fields['owner'] = serializers.PrimaryKeyRelatedField(
+                read_only=True
+            )
+        return fields
+
     def get_is_user_owner(self, obj) -> bool:
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
-            return obj.owner == request.user
+            return obj.owner_id == request.user.id
         return False
 
     def get_property_type_display(self, obj) -> str:
@@ -47,9 +133,13 @@ class ListingSerializer(serializers.ModelSerializer):
     def get_listing_url(self, obj) -> str:
         request = self.context.get('request')
         if request:
-            return request.build_absolute_uri(
-                reverse('listing-detail', kwargs={'pk': obj.pk})
-            )
+            # Адрес списка вычисляется один раз на запрос,
+            # адрес объявления - {list_url}{pk}/ (DefaultRouter)
+            if 'listing_list_url' not in self.context:
+                self.context['listing_list_url'] = request.build_absolute_uri(
+                    reverse('listing-list')
+                )
+            return f'{self.context["listing_list_url"]}{obj.pk}/'
         return None
 
 
@@ -68,7 +158,7 @@ class ViewHistorySerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request:
             return request.build_absolute_uri(
-                reverse('listing-detail', kwargs={'pk': obj.listing.pk})
+                reverse('listing-detail', kwargs={'pk': obj.listing_id})
             )
         return None
 
@@ -76,9 +166,182 @@ class ViewHistorySerializer(serializers.ModelSerializer):
 class SearchHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = SearchHistory
-        exclude = ['id', 'user']
+        exclude = ['id', 'user', 'visitor']
+
+
+class SearchStatsQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(
+        choices=['24h', '7d', 'all'], default='all'
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.LISTING_SEARCH_STATS_MAX_LIMIT,
+        default=10
+    )
+
+
+class ReviewFeedQuerySerializer(serializers.Serializer):
+    ordering = serializers.ChoiceField(
+        choices=['-created_at', 'created_at', '-rating', 'rating'],
+        default='-created_at'
+    )
 
 
 class SearchStatsSerializer(serializers.Serializer):
     term = serializers.CharField(max_length=255)
     total_searches = serializers.IntegerField()
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    '''Окно календаря: ?from=YYYY-MM-DD&to=YYYY-MM-DD&bitmap=true'''
+    bitmap = serializers.BooleanField(default=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to'] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, data):
+        date_from = data.get('from') or timezone.now().date()
+        date_to = data.get('to') or date_from + timedelta(
+            days=settings.LISTING_CALENDAR_DEFAULT_DAYS
+        )
+        if date_from >= date_to:
+            raise serializers.ValidationError(
+                'The start date must be before the end date.'
+            )
+        if (date_to - date_from).days > settings.LISTING_CALENDAR_MAX_DAYS:
+            raise serializers.ValidationError(
+                f'The period cannot be longer than '
+                f'{settings.LISTING_CALENDAR_MAX_DAYS} days.'
+            )
+        data['from'], data['to'] = date_from, date_to
+        return data
+
+
+class ReservedPeriodSerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+
+    def to_representation(self, instance):
+        return super().to_representation({
+            'check_in': instance[0],
+            'check_out': instance[1]
+        })
+
+
+class CalendarSerializer(serializers.Serializer):
+    periods = ReservedPeriodSerializer(many=True)
+    bitmap = serializers.CharField(required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField()
+        fields['to'] = serializers.DateField()
+        return fields
+
+
+class AvailabilityQuerySerializer(CalendarQuerySerializer):
+    '''Окно и объявления для матрицы занятости: ?ids=1,2,3&from=&to='''
+    ids = serializers.CharField()
+    bitmap = None
+
+    def validate_ids(self, value):
+        try:
+            ids = list(dict.fromkeys(
+                int(pk) for pk in value.split(',') if pk.strip()
+            ))
+        except ValueError:
+            raise serializers.ValidationError(
+                'Listing ids must be comma-separated integers.'
+            )
+        if not ids:
+            raise serializers.ValidationError('At least one id is required.')
+        if len(ids) > settings.LISTING_AVAILABILITY_MAX_IDS:
+            raise serializers.ValidationError(
+                f'No more than {settings.LISTING_AVAILABILITY_MAX_IDS} '
+                f'listings per request.'
+            )
+        return ids
+
+
+class AvailabilityRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    bitmap = serializers.CharField()
+
+
+class AvailabilitySerializer(CalendarSerializer):
+    periods = None
+    bitmap = None
+    listings = AvailabilityRowSerializer(many=True)
+
+
+class FacetValueSerializer(serializers.Serializer):
+    label = serializers.CharField()
+    min = serializers.IntegerField(allow_null=True)
+    max = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+
+
+class PropertyTypeFacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class FacetsSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    property_type = PropertyTypeFacetSerializer(many=True)
+    rooms = FacetValueSerializer(many=True)
+    price = FacetValueSerializer(many=True)
+
+
+class CacheStatsSerializer(serializers.Serializer):
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_ratio = serializers.FloatField()
+
+
+class RatingCountSerializer(serializers.Serializer):
+    rating = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class RatingSummarySerializer(serializers.Serializer):
+    rating = serializers.FloatField()
+    number_of_reviews = serializers.IntegerField()
+    distribution = RatingCountSerializer(
+        many=True, source='rating_distribution'
+    )
+
+
+class HostSummaryQuerySerializer(CalendarQuerySerializer):
+    '''Период сводки арендодателя: ?from=YYYY-MM-DD&to=YYYY-MM-DD'''
+    bitmap = None
+
+
+class HostStatsSerializer(serializers.Serializer):
+    pending_bookings = serializers.IntegerField()
+    confirmed_bookings = serializers.IntegerField()
+    upcoming_check_ins = serializers.IntegerField()
+    next_check_in = serializers.DateField(allow_null=True)
+    booked_nights = serializers.IntegerField()
+    occupancy_rate = serializers.FloatField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    number_of_views = serializers.IntegerField()
+    number_of_reviews = serializers.IntegerField()
+    rating = serializers.FloatField()
+
+
+class HostListingStatsSerializer(HostStatsSerializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    is_active = serializers.BooleanField()
+
+
+class HostSummarySerializer(CalendarSerializer):
+    periods = None
+    bitmap = None
+    total = HostStatsSerializer()
+    listings = HostListingStatsSerializer(many=True)
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.listings.models import Listing
+from apps.listings.search import get_search_backend
+from apps.listings.cache import invalidate_listings
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_cache_on_change(sender, **kwargs):
+    transaction.on_commit(invalidate_listings)
+
+
+@receiver(post_save, sender=Listing)
+def index_listing_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'title', 'description'} & set(update_fields):
+        return
+    get_search_backend().index_listing(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def remove_listing_on_delete(sender, instance, **kwargs):
+    get_search_backend().remove_listing(instance.pk)
@@ -0,0 +1,121 @@
+'''
+Сводка арендодателя по его объявлениям (ListingViewSet.host_summary).
+
+Два запроса независимо от числа объявлений: объявления со счетчиками
+просмотров и рейтинга и бронирования, сгруппированные по объявлению
+(Count/Min/Sum с filter). Итоги считаются по строкам в памяти.
+Цена бронирования - цена за ночь: выручка за период - цена, умноженная
+на число ночей бронирования, попадающих в период.
+'''
+from django.db.models import (
+    Count, DateField, DecimalField, F, Func, IntegerField, Min, Q, Sum, Value
+)
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from apps.listings.models import Listing
+from apps.bookings.models import BookingStatus, Booking
+
+
+class DateDiff(Func):
+    '''Число дней между датами: DateDiff(end, start)'''
+    arity = 2
+    arg_joiner = ' - '
+    template = '(%(expressions)s)'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template='CAST(JULIANDAY(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - JULIANDAY(',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            function='DATEDIFF',
+            template='%(function)s(%(expressions)s)',
+            arg_joiner=', ',
+            **extra_context
+        )
+
+
+def get_booking_stats(user, date_from, date_to):
+    '''{listing_id: счетчики бронирований} одним GROUP BY'''
+    today = timezone.now().date()
+    confirmed = Q(status=BookingStatus.CONFIRMED)
+    in_period = confirmed & Q(
+        check_in_date__lt=date_to, check_out_date__gt=date_from
+    )
+    # Ночи бронирования внутри периода [date_from, date_to)
+    nights = DateDiff(
+        Least('check_out_date', Value(date_to, output_field=DateField())),
+        Greatest('check_in_date', Value(date_from, output_field=DateField()))
+    )
+    rows = Booking.objects.filter(
+        listing__owner=user
+    ).order_by().values('listing_id').annotate(
+        pending_bookings=Count('pk', filter=Q(status=BookingStatus.PENDING)),
+        confirmed_bookings=Count('pk', filter=confirmed),
+        upcoming_check_ins=Count(
+            'pk', filter=confirmed & Q(check_in_date__gte=today)
+        ),
+        next_check_in=Min(
+            'check_in_date', filter=confirmed & Q(check_in_date__gte=today)
+        ),
+        booked_nights=Sum(nights, filter=in_period),
+        revenue=Sum(
+            F('price') * nights,
+            filter=in_period,
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    )
+    return {row.pop('listing_id'): row for row in rows}
+
+
+COUNTERS = [
+    'pending_bookings', 'confirmed_bookings', 'upcoming_check_ins',
+    'booked_nights', 'revenue', 'number_of_views', 'number_of_reviews',
+    'rating_sum'
+]
+
+
+def get_host_summary(user, date_from, date_to):
+    '''Счетчики по объявлениям пользователя и итог за период'''
+    days = (date_to - date_from).days
+    listings = list(Listing.objects.filter(owner=user).order_by('pk').values(
+        'id', 'title', 'is_active', 'number_of_views', 'rating',
+        'number_of_reviews', 'rating_sum'
+    ))
+    stats = get_booking_stats(user, date_from, date_to)
+    for listing in listings:
+        listing.update(stats.get(listing['id'], {}))
+        for name in COUNTERS:
+            listing[name] = listing.get(name) or 0
+        listing['occupancy_rate'] = listing['booked_nights'] / days
+    total = {
+        name: sum(listing[name] for listing in listings)
+        for name in COUNTERS
+    }
+    check_ins = [
+        listing['next_check_in'] for listing in listings
+        if listing.get('next_check_in')
+    ]
+    total['next_check_in'] = min(check_ins, default=None)
+    total['rating'] = (
+        total['rating_sum'] / total['number_of_reviews']
+        if total['number_of_reviews'] else 0.0
+    )
+    total['occupancy_rate'] = (
+        total['booked_nights'] / (days * len(listings)) if listings else 0.0
+    )
+    return {
+        'from': date_from,
+        'to': date_to,
+        'total': total,
+        'listings': listings
+    }
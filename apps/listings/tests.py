@@ -1,3 +1,1404 @@
-from django.test import TestCase
+import base64
+import json
+import re
+import unittest
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.testing import QueryCountMixin
+from apps.pagination import KeysetPagination, ListPagination
+from apps.listings.models import (
+    Listing,
+    ViewHistory,
+    SearchHistory,
+    PropertyType,
+    SearchTermStats,
+    StatsPeriod
+)
+from apps.listings.buffers import view_buffer, search_log
+from apps.listings.cache import get_cache
+from apps.listings.availability import merge_periods, periods_to_bitmap
+from apps.listings.serializers import CARD_FIELDS
+from apps.users.serializers import UserSerializer
+from apps.listings.search import get_search_backend, sqlite_fts_available
+from apps.bookings.models import BookingStatus, Booking
+from apps.reviews.models import Review
+
+
+# Строка плана без индекса: "SCAN table" (но не "SCAN table USING ...")
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+# Сортировка результата во временном B-дереве вместо порядка индекса
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+def explain(sql):
+    '''Строки EXPLAIN QUERY PLAN (SQLite) для запроса'''
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class QueryPlanTests(TestCase):
+    '''
+    Регрессионные тесты планов запросов: каждый SELECT горячих
+    эндпоинтов должен использовать индекс, а не сканировать таблицу
+    '''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Flat in Berlin',
+            description='Cozy flat',
+            address='Berlin',
+            property_type=PropertyType.APARTMENT,
+            rooms=2,
+            price=100,
+            owner=cls.owner
+        )
+        today = timezone.now().date()
+        Booking.objects.create(
+            listing=cls.listing,
+            user=cls.guest,
+            check_in_date=today + timedelta(days=1),
+            check_out_date=today + timedelta(days=3),
+            status=BookingStatus.CONFIRMED
+        )
+        Review.objects.create(
+            listing=cls.listing, user=cls.guest, rating=5
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def assertNoFullScan(self, path, params=None, sorted_by_index=False):
+        '''
+        sorted_by_index - порядок сортировки дает индекс:
+        в плане не должно быть USE TEMP B-TREE FOR ORDER BY
+        '''
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, path)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for line in explain(sql):
+                line = line.strip()
+                match = FULL_SCAN_RE.match(line)
+                if match:
+                    self.fail(
+                        f'{path} {params or ""}: full scan of '
+                        f'{match.group(1)}\n{sql}'
+                    )
+                if sorted_by_index and line == TEMP_SORT:
+                    self.fail(
+                        f'{path} {params or ""}: sort without index\n{sql}'
+                    )
+
+    def test_listing_list(self):
+        self.assertNoFullScan('/api/v1/listings/')
+
+    def test_listing_list_orderings(self):
+        for ordering in [
+            'price', '-price', 'created_at', '-created_at', 'rating',
+            '-rating', 'number_of_reviews', '-number_of_views'
+        ]:
+            self.assertNoFullScan(
+                '/api/v1/listings/', {'ordering': ordering},
+                sorted_by_index=True
+            )
+
+    def test_listing_list_cursor(self):
+        for ordering in ['price', '-created_at', 'rating']:
+            self.assertNoFullScan(
+                '/api/v1/listings/',
+                {'pagination': 'cursor', 'ordering': ordering},
+                sorted_by_index=True
+            )
+
+    def test_listing_list_filters(self):
+        self.assertNoFullScan(
+            '/api/v1/listings/', {'price__gte': 50, 'price__lte': 150}
+        )
+        self.assertNoFullScan('/api/v1/listings/', {'rooms__range': '1,3'})
+        self.assertNoFullScan(
+            '/api/v1/listings/',
+            {'property_type': PropertyType.APARTMENT, 'ordering': 'price'},
+            sorted_by_index=True
+        )
+
+    def test_listing_availability(self):
+        today = timezone.now().date()
+        self.assertNoFullScan('/api/v1/listings/', {
+            'available_from': today + timedelta(days=2),
+            'available_to': today + timedelta(days=5),
+        })
+
+    def test_listing_search(self):
+        self.assertNoFullScan('/api/v1/listings/', {'search': 'berlin'})
+        self.assertEqual(search_log.flush(), 1)
+
+    def test_listing_detail_actions(self):
+        pk = self.listing.pk
+        self.assertNoFullScan(f'/api/v1/listings/{pk}/')
+        # Просмотр записан в буфер - сохраняем его внутри теста
+        self.assertEqual(view_buffer.flush(), 1)
+        self.assertNoFullScan(f'/api/v1/listings/{pk}/reserved-periods/')
+        self.assertNoFullScan(f'/api/v1/listings/{pk}/reserved-dates/')
+        self.assertNoFullScan(f'/api/v1/listings/{pk}/reviews/')
+        self.assertNoFullScan(
+            f'/api/v1/listings/{pk}/reviews/', {'ordering': '-rating'}
+        )
+
+    def test_user_histories(self):
+        self.assertNoFullScan('/api/v1/listings/my-view-history/')
+        self.assertNoFullScan('/api/v1/listings/my-search-history/')
+
+    def test_bookings(self):
+        self.assertNoFullScan('/api/v1/bookings/')
+        self.client.force_authenticate(self.owner)
+        self.assertNoFullScan('/api/v1/bookings/my-hosted/')
+        self.assertNoFullScan('/api/v1/listings/host-summary/')
+
+    def test_reviews(self):
+        self.assertNoFullScan('/api/v1/reviews/')
+
+
+def create_listing(owner, title='Flat'):
+    return Listing.objects.create(
+        title=title,
+        description='Cozy flat',
+        address='Berlin',
+        property_type=PropertyType.APARTMENT,
+        rooms=2,
+        price=100,
+        owner=owner
+    )
+
+
+class QueryCountTests(QueryCountMixin, TestCase):
+    '''Число запросов эндпоинтов объявлений не зависит от числа строк'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.listing = create_listing(
+            User.objects.create_user('owner', 'owner@test.de', 'pw')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+        self.counter = 0
+
+    def new_user(self):
+        self.counter += 1
+        name = f'user{self.counter}'
+        return User.objects.create_user(name, f'{name}@test.de', 'pw')
+
+    def add_listings(self, owner=None):
+        for _ in range(3):
+            create_listing(owner or self.new_user())
+
+    def test_listing_list(self):
+        self.assertConstantQueries('/api/v1/listings/', self.add_listings)
+        for params in [
+            {'view': 'card'},
+            {'fields': 'id,title,owner'},
+            {'fields': 'id,owner', 'expand': 'owner'},
+        ]:
+            self.assertConstantQueries(
+                '/api/v1/listings/', self.add_listings, params
+            )
+
+    def test_my_created(self):
+        create_listing(self.guest)
+        self.assertConstantQueries(
+            '/api/v1/listings/my-created/',
+            lambda: self.add_listings(owner=self.guest)
+        )
+
+    def test_my_view_history(self):
+        def add_views():
+            for _ in range(3):
+                ViewHistory.objects.create(
+                    listing=create_listing(self.new_user()), user=self.guest
+                )
+        add_views()
+        self.assertConstantQueries(
+            '/api/v1/listings/my-view-history/', add_views
+        )
+
+    def test_listing_reviews(self):
+        def add_reviews():
+            for _ in range(3):
+                Review.objects.create(
+                    listing=self.listing, user=self.new_user(), rating=4
+                )
+        add_reviews()
+        for ordering in ['-created_at', 'rating']:
+            self.assertConstantQueries(
+                f'/api/v1/listings/{self.listing.pk}/reviews/',
+                add_reviews,
+                {'ordering': ordering}
+            )
+
+
+class HostSummaryTests(QueryCountMixin, TestCase):
+    '''Сводка арендодателя: фиксированное число запросов и счетчики'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.today = timezone.now().date()
+
+    def book(self, listing, days, status=BookingStatus.CONFIRMED):
+        Booking.objects.create(
+            listing=listing,
+            user=self.guest,
+            check_in_date=self.today + timedelta(days=days[0]),
+            check_out_date=self.today + timedelta(days=days[1]),
+            price=listing.price,
+            status=status
+        )
+
+    def add_listings(self):
+        for _ in range(3):
+            listing = create_listing(self.owner)
+            self.book(listing, (1, 3))
+            self.book(listing, (4, 6), BookingStatus.PENDING)
+
+    def test_constant_queries(self):
+        self.add_listings()
+        self.assertConstantQueries(
+            '/api/v1/listings/host-summary/', self.add_listings
+        )
+
+    def test_summary(self):
+        first = create_listing(self.owner)
+        second = create_listing(self.owner)
+        create_listing(self.guest)
+        # 2 из 3 ночей внутри периода
+        self.book(first, (-2, 1))
+        self.book(first, (5, 15))
+        self.book(second, (2, 4), BookingStatus.PENDING)
+        response = self.client.get('/api/v1/listings/host-summary/', {
+            'from': str(self.today - timedelta(days=1)),
+            'to': str(self.today + timedelta(days=9))
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row['id'] for row in response.data['listings']],
+            [first.pk, second.pk]
+        )
+        total = response.data['total']
+        self.assertEqual(total['pending_bookings'], 1)
+        self.assertEqual(total['confirmed_bookings'], 2)
+        self.assertEqual(total['upcoming_check_ins'], 1)
+        self.assertEqual(total['booked_nights'], 2 + 4)
+        self.assertEqual(total['revenue'], '600.00')
+        self.assertAlmostEqual(total['occupancy_rate'], 6 / 20)
+        self.assertAlmostEqual(
+            response.data['listings'][0]['occupancy_rate'], 6 / 10
+        )
+
+
+@mock.patch.object(KeysetPagination, 'page_size', 2)
+class KeysetPaginationTests(TestCase):
+    '''Обход списка по курсору вперед и назад при равных значениях'''
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        for price, rating in [
+            (300, 4), (100, 3), (200, 5), (100, 5), (300, 4), (100, 3),
+            (200, 1)
+        ]:
+            Listing.objects.filter(pk=create_listing(owner).pk).update(
+                price=price, rating=rating
+            )
+
+    def setUp(self):
+        # Аутентифицированный пользователь - без кеша списка
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user('guest', 'guest@test.de', 'pw')
+        )
+
+    def walk(self, url, params, link):
+        pages = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url, params = response.data[link], None
+        return pages
+
+    def test_walk_forward_and_back(self):
+        for ordering in ['price', '-price', 'created_at', '-rating']:
+            expected = list(Listing.objects.order_by(
+                ordering, '-id' if ordering.startswith('-') else 'id'
+            ).values_list('id', flat=True))
+            forward = self.walk(
+                '/api/v1/listings/',
+                {'pagination': 'cursor', 'ordering': ordering},
+                'next'
+            )
+            self.assertEqual(sum(forward, []), expected, ordering)
+            # Назад от последней страницы
+            response = self.client.get(
+                '/api/v1/listings/',
+                {'pagination': 'cursor', 'ordering': ordering}
+            )
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+            backward = self.walk(response.data['previous'], None, 'previous')
+            self.assertEqual(
+                sum(reversed(backward), []) + forward[-1], expected, ordering
+            )
+
+    def test_multiple_fields(self):
+        # Все поля сортировки входят в ключ, id - в направлении первого
+        for ordering, expected_ordering in [
+            ('price,-rating', ['price', '-rating', 'id']),
+            ('-price,rating', ['-price', 'rating', '-id']),
+            ('-rating,price,created_at', [
+                '-rating', 'price', 'created_at', '-id'
+            ]),
+        ]:
+            expected = list(Listing.objects.order_by(
+                *expected_ordering
+            ).values_list('id', flat=True))
+            params = {'pagination': 'cursor', 'ordering': ordering}
+            forward = self.walk('/api/v1/listings/', params, 'next')
+            self.assertEqual(sum(forward, []), expected, ordering)
+            response = self.client.get('/api/v1/listings/', params)
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+            backward = self.walk(response.data['previous'], None, 'previous')
+            self.assertEqual(
+                sum(reversed(backward), []) + forward[-1], expected, ordering
+            )
+
+    def test_invalid_cursor(self):
+        for cursor in [
+            'not-base64!',
+            base64.urlsafe_b64encode(b'{"i":1}').decode(),
+            base64.urlsafe_b64encode(
+                json.dumps({'v': 'abc', 'i': 1}).encode()
+            ).decode(),
+            base64.urlsafe_b64encode(
+                json.dumps({'v': [[1]], 'i': 1}).encode()
+            ).decode(),
+            # Число значений не совпадает с полями сортировки
+            base64.urlsafe_b64encode(
+                json.dumps({'v': [1, 2], 'i': 1}).encode()
+            ).decode(),
+        ]:
+            for ordering in ['price', 'created_at']:
+                response = self.client.get(
+                    '/api/v1/listings/',
+                    {'cursor': cursor, 'ordering': ordering}
+                )
+                self.assertEqual(response.status_code, 404, cursor)
+
+
+@mock.patch.object(KeysetPagination, 'page_size', 2)
+class ReviewFeedTests(TestCase):
+    '''Лента отзывов объявления по курсору при равных оценках'''
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        # id отзывов не совпадают с id объявления (listing_url)
+        create_listing(owner)
+        cls.listing = create_listing(owner)
+        cls.guests = []
+        for number, rating in enumerate([5, 3, 5, 4, 3, 5, 4]):
+            guest = User.objects.create_user(f'guest{number}')
+            cls.guests.append(guest)
+            Review.objects.create(
+                listing=cls.listing, user=guest, rating=rating
+            )
+
+    def walk(self, ordering):
+        pages = []
+        url = f'/api/v1/listings/{self.listing.pk}/reviews/'
+        params = {'ordering': ordering}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            pages.append(response.data['results'])
+            url, params = response.data['next'], None
+        return [row for page in pages for row in page]
+
+    def expected(self, ordering):
+        return list(Review.objects.filter(listing=self.listing).order_by(
+            ordering, '-id' if ordering.startswith('-') else 'id'
+        ).values_list('id', flat=True))
+
+    def test_walk(self):
+        for ordering in ['-created_at', 'created_at', '-rating', 'rating']:
+            rows = self.walk(ordering)
+            self.assertEqual(
+                [row['id'] for row in rows], self.expected(ordering), ordering
+            )
+        self.assertEqual(
+            [row['rating'] for row in self.walk('rating')],
+            [3, 3, 4, 4, 5, 5, 5]
+        )
+
+    def test_stable_after_insert(self):
+        url = f'/api/v1/listings/{self.listing.pk}/reviews/'
+        response = self.client.get(url, {'ordering': 'rating'})
+        seen = [row['id'] for row in response.data['results']]
+        # Новый отзыв перед курсором не сдвигает следующие страницы
+        Review.objects.create(
+            listing=self.listing,
+            user=User.objects.create_user('late'),
+            rating=0
+        )
+        url = response.data['next']
+        while url:
+            response = self.client.get(url)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen, self.expected('rating')[1:])
+
+    def test_listing_url(self):
+        rows = self.walk('-created_at')
+        self.assertTrue(any(row['id'] != self.listing.pk for row in rows))
+        for row in rows:
+            self.assertEqual(
+                row['listing_url'],
+                f'http://testserver/api/v1/listings/{self.listing.pk}/'
+            )
+
+    def test_invalid_ordering(self):
+        response = self.client.get(
+            f'/api/v1/listings/{self.listing.pk}/reviews/',
+            {'ordering': 'user'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ViewBufferTests(TestCase):
+    '''Счетчик просмотров учитывает только фактически вставленные строки'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.listing = create_listing(
+            User.objects.create_user('owner', 'owner@test.de', 'pw')
+        )
+        cls.first = User.objects.create_user('first')
+        cls.second = User.objects.create_user('second')
+
+    def number_of_views(self):
+        return Listing.objects.values_list(
+            'number_of_views', flat=True
+        ).get(pk=self.listing.pk)
+
+    def test_concurrent_insert_counted_once(self):
+        items = {
+            (self.listing.pk, self.first.pk),
+            (self.listing.pk, self.second.pk)
+        }
+        # Другой воркер уже сохранил просмотр first, но эта выборка
+        # существующих пар выполнена до его коммита
+        ViewHistory.objects.create(listing=self.listing, user=self.first)
+        Listing.objects.filter(pk=self.listing.pk).update(number_of_views=1)
+        with mock.patch.object(
+            view_buffer, 'existing_views', return_value=set()
+        ):
+            view_buffer.persist(items)
+        self.assertEqual(self.number_of_views(), 2)
+        self.assertEqual(ViewHistory.objects.count(), 2)
+        # Повторные просмотры не увеличивают счетчик
+        view_buffer.persist(items)
+        self.assertEqual(self.number_of_views(), 2)
+
+
+class SearchBackendTestsMixin:
+    '''
+    Корректность поиска движком backend: префиксы, несколько слов (AND),
+    обновление индекса сигналами и командой rebuild_search_index
+    '''
+    backend = None
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.berlin = create_listing(owner, 'Sunny flat in Berlin')
+        cls.munich = create_listing(owner, 'Quiet house in Munich')
+        cls.loft = create_listing(owner, 'Berlin loft')
+
+    def setUp(self):
+        # Движок кешируется на процесс: новый экземпляр на каждый тест
+        settings_override = override_settings(
+            LISTING_SEARCH_BACKEND=self.backend
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+        get_search_backend().rebuild()
+        # История поиска пишется в транзакции теста
+        self.addCleanup(search_log.flush)
+        self.client = APIClient()
+        self.client.force_authenticate(self.berlin.owner)
+
+    def search(self, text):
+        response = self.client.get('/api/v1/listings/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.data['results']}
+
+    def test_backend(self):
+        self.assertEqual(
+            type(get_search_backend()).__name__,
+            self.backend.rsplit('.', 1)[-1]
+        )
+
+    def test_prefix(self):
+        self.assertEqual(
+            self.search('berl'), {self.berlin.pk, self.loft.pk}
+        )
+        self.assertEqual(self.search('MUN'), {self.munich.pk})
+        self.assertEqual(self.search('hamburg'), set())
+
+    def test_multiple_terms(self):
+        self.assertEqual(self.search('berlin sunny'), {self.berlin.pk})
+        self.assertEqual(self.search('berl lof'), {self.loft.pk})
+        self.assertEqual(self.search('munich loft'), set())
+
+    def test_terms_combined_with_and(self):
+        # Каждое слово по отдельности находит объявления,
+        # вместе - только содержащие оба слова
+        self.assertEqual(self.search('sunny'), {self.berlin.pk})
+        self.assertEqual(self.search('quiet'), {self.munich.pk})
+        self.assertEqual(self.search('sunny quiet'), set())
+        self.assertEqual(self.search('flat sunny'), {self.berlin.pk})
+
+    def test_edit_and_delete(self):
+        self.search('berlin')
+        self.loft.title = 'Hamburg loft'
+        self.loft.save()
+        self.assertEqual(self.search('berlin'), {self.berlin.pk})
+        self.assertEqual(self.search('hamb'), {self.loft.pk})
+        # Обновление без полей текста индекс не затрагивает
+        self.loft.price = 120
+        self.loft.save(update_fields=['price'])
+        self.assertEqual(self.search('hamb'), {self.loft.pk})
+        self.berlin.delete()
+        self.assertEqual(self.search('berlin sunny'), set())
+        self.assertEqual(self.search('sunny'), set())
+
+    def test_rebuild_command(self):
+        self.search('berlin')
+        # update() не отправляет сигналы - индекс устаревает
+        Listing.objects.filter(pk=self.munich.pk).update(
+            title='Quiet house in Dresden'
+        )
+        self.assertEqual(self.search('dresden'), set())
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('dresden'), {self.munich.pk})
+        self.assertEqual(self.search('munich'), set())
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5')
+class SQLiteFTSSearchTests(SearchBackendTestsMixin, TestCase):
+    backend = 'apps.listings.search.SQLiteFTSSearchBackend'
+
+    def setUp(self):
+        # Таблица FTS5 создается миграцией в тестовой БД
+        self.assertTrue(sqlite_fts_available())
+        super().setUp()
+
+
+class InvertedIndexSearchTests(SearchBackendTestsMixin, TestCase):
+    backend = 'apps.listings.search.InvertedIndexSearchBackend'
+
+    @override_settings(LISTING_SEARCH_MAX_RANKED=1)
+    def test_ranking_limit(self):
+        # Ограничение касается только ранжирования, не результатов:
+        # 'flat' дважды только в self.berlin, остальные - после него по id
+        response = self.client.get('/api/v1/listings/', {'search': 'flat'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [self.berlin.pk, self.munich.pk, self.loft.pk]
+        )
+
+
+class ListingListCacheTests(TestCase):
+    '''
+    Кеш ответов списка объявлений для анонимных пользователей:
+    MISS -> HIT, обход для аутентифицированных, сброс после коммита
+    '''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.listing = create_listing(cls.owner, 'Flat in Berlin')
+
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        self.client = APIClient()
+
+    def get(self, client=None, params=None):
+        response = (client or self.client).get('/api/v1/listings/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def titles(self, response):
+        return [row['title'] for row in response.data['results']]
+
+    def test_miss_then_hit(self):
+        first = self.get(params={'price__gte': '50'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # Тот же запрос в другой записи попадает в тот же ключ
+        second = self.get(params={'price__gte': '50.00'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(
+            self.get(params={'price__gte': '60'})['X-Cache'], 'MISS'
+        )
+
+    def test_authenticated_bypass(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        for _ in range(2):
+            self.assertNotIn('X-Cache', self.get(client))
+        # Ответ аутентифицированному пользователю не попал в кеш
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        self.assertNotIn('X-Cache', self.get(client))
+
+    @override_settings(ALLOWED_HOSTS=['a.test', 'b.test'])
+    @mock.patch.object(ListPagination, 'page_size', 1)
+    def test_links_per_host(self):
+        create_listing(self.owner)
+
+        def next_link(host, secure=False):
+            response = self.client.get(
+                '/api/v1/listings/', HTTP_HOST=host, secure=secure
+            )
+            self.assertEqual(response.status_code, 200)
+            return response['X-Cache'], response.data['next']
+
+        self.assertEqual(
+            next_link('a.test'),
+            ('MISS', 'http://a.test/api/v1/listings/?page=2')
+        )
+        # Другой хост или схема (https за прокси) - свои ссылки
+        self.assertEqual(
+            next_link('b.test', secure=True),
+            ('MISS', 'https://b.test/api/v1/listings/?page=2')
+        )
+        self.assertEqual(
+            next_link('a.test', secure=True),
+            ('MISS', 'https://a.test/api/v1/listings/?page=2')
+        )
+        self.assertEqual(
+            next_link('a.test'),
+            ('HIT', 'http://a.test/api/v1/listings/?page=2')
+        )
+
+    def test_invalidated_after_commit(self):
+        self.get()
+        self.listing.title = 'Flat in Hamburg'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.listing.save()
+            # До коммита кеш не сбрасывается
+            self.assertEqual(self.get()['X-Cache'], 'HIT')
+        self.assertEqual(len(callbacks), 1)
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.titles(response), ['Flat in Hamburg'])
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.delete()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.titles(response), [])
+
+
+class CalendarTests(TestCase):
+    '''
+    Календарь занятости: объединение периодов, битовая карта окна
+    и сброс кеша при подтверждении и отмене бронирования
+    '''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.listing = create_listing(cls.owner)
+
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        self.client = APIClient()
+        # Окно - следующий месяц целиком
+        today = timezone.now().date()
+        self.date_from = (today.replace(day=1) + timedelta(days=32)).replace(
+            day=1
+        )
+        self.date_to = (self.date_from + timedelta(days=32)).replace(day=1)
+
+    def day(self, number):
+        return self.date_from + timedelta(days=number)
+
+    def book(self, check_in, check_out, status=BookingStatus.PENDING):
+        return Booking.objects.create(
+            listing=self.listing,
+            user=self.guest,
+            check_in_date=check_in,
+            check_out_date=check_out,
+            status=status
+        )
+
+    def calendar(self):
+        response = self.client.get(
+            f'/api/v1/listings/{self.listing.pk}/calendar/',
+            {'from': self.date_from, 'to': self.date_to, 'bitmap': 'true'}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_merge_periods(self):
+        self.assertEqual(merge_periods([
+            (date(2025, 1, 1), date(2025, 1, 3)),
+            # Смежный: выезд в день заезда
+            (date(2025, 1, 3), date(2025, 1, 5)),
+            # Пересекающийся и вложенный
+            (date(2025, 1, 4), date(2025, 1, 8)),
+            (date(2025, 1, 5), date(2025, 1, 6)),
+            (date(2025, 1, 10), date(2025, 1, 12)),
+        ]), [
+            (date(2025, 1, 1), date(2025, 1, 8)),
+            (date(2025, 1, 10), date(2025, 1, 12)),
+        ])
+        self.assertEqual(merge_periods([]), [])
+
+    def test_bitmap_month_edges(self):
+        # Окно 30.01-03.02: ночи 30.01, 31.01, 01.02, 02.02
+        date_from, date_to = date(2025, 1, 30), date(2025, 2, 3)
+        self.assertEqual(periods_to_bitmap(
+            [(date(2025, 1, 31), date(2025, 2, 2))], date_from, date_to
+        ), '0110')
+        self.assertEqual(periods_to_bitmap(
+            [(date_from, date(2025, 1, 31)), (date(2025, 2, 2), date_to)],
+            date_from, date_to
+        ), '1001')
+        self.assertEqual(periods_to_bitmap([], date_from, date_to), '0000')
+        # Високосный февраль
+        self.assertEqual(periods_to_bitmap(
+            [(date(2024, 2, 28), date(2024, 3, 1))],
+            date(2024, 2, 27), date(2024, 3, 2)
+        ), '0110')
+
+    def test_periods_clipped_to_window(self):
+        # Бронирования через границы месяца обрезаются окном
+        self.book(self.day(-2), self.day(2), BookingStatus.CONFIRMED)
+        self.book(
+            self.date_to - timedelta(days=1),
+            self.date_to + timedelta(days=3),
+            BookingStatus.CONFIRMED
+        )
+        self.book(self.day(2), self.day(4), BookingStatus.CONFIRMED)
+        self.book(self.day(10), self.day(12), BookingStatus.CANCELLED)
+        data = self.calendar()
+        nights = (self.date_to - self.date_from).days
+        self.assertEqual(data['periods'], [
+            {'check_in': str(self.date_from), 'check_out': str(self.day(4))},
+            {
+                'check_in': str(self.date_to - timedelta(days=1)),
+                'check_out': str(self.date_to)
+            },
+        ])
+        self.assertEqual(
+            data['bitmap'], '1111' + '0' * (nights - 5) + '1'
+        )
+
+    def test_confirm_and_cancel_invalidate(self):
+        booking = self.book(self.day(3), self.day(5))
+        self.assertEqual(self.calendar()['periods'], [])
+        self.client.force_authenticate(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/v1/bookings/{booking.pk}/confirm/'
+            )
+        self.assertEqual(response.status_code, 200)
+        data = self.calendar()
+        self.assertEqual(data['periods'], [
+            {'check_in': str(self.day(3)), 'check_out': str(self.day(5))}
+        ])
+        self.assertEqual(data['bitmap'][:6], '000110')
+        self.client.force_authenticate(self.guest)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/v1/bookings/{booking.pk}/cancel/'
+            )
+        self.assertEqual(response.status_code, 200)
+        data = self.calendar()
+        self.assertEqual(data['periods'], [])
+        self.assertNotIn('1', data['bitmap'])
+
+    def test_cached_until_commit(self):
+        booking = self.book(self.day(3), self.day(5))
+        self.calendar()
+        # update() в обход сигналов: календарь из кеша не меняется
+        Booking.objects.filter(pk=booking.pk).update(
+            status=BookingStatus.CONFIRMED
+        )
+        self.assertEqual(self.calendar()['periods'], [])
+        booking.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertEqual(len(self.calendar()['periods']), 1)
+
+
+class AvailabilityMatrixTests(QueryCountMixin, TestCase):
+    '''Матрица занятости по списку объявлений'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        self.client = APIClient()
+        self.date_from = timezone.now().date() + timedelta(days=10)
+        self.date_to = self.date_from + timedelta(days=7)
+
+    def book(self, listing, nights, status):
+        return Booking.objects.create(
+            listing=listing,
+            user=self.guest,
+            check_in_date=self.date_from + timedelta(days=nights[0]),
+            check_out_date=self.date_from + timedelta(days=nights[1]),
+            status=status
+        )
+
+    def params(self, listings):
+        return {
+            'ids': ','.join(str(listing.pk) for listing in listings),
+            'from': self.date_from,
+            'to': self.date_to
+        }
+
+    def test_matrix(self):
+        confirmed = create_listing(self.owner)
+        self.book(confirmed, (-1, 2), BookingStatus.CONFIRMED)
+        self.book(confirmed, (2, 3), BookingStatus.CONFIRMED)
+        self.book(confirmed, (5, 9), BookingStatus.CONFIRMED)
+        pending = create_listing(self.owner)
+        self.book(pending, (0, 3), BookingStatus.PENDING)
+        mixed = create_listing(self.owner)
+        self.book(mixed, (1, 4), BookingStatus.CANCELLED)
+        self.book(mixed, (4, 5), BookingStatus.CONFIRMED)
+        inactive = create_listing(self.owner)
+        Listing.objects.filter(pk=inactive.pk).update(is_active=False)
+        params = self.params([mixed, confirmed, inactive, pending])
+        params['ids'] += f',{inactive.pk + 100},{mixed.pk}'
+        response = self.client.get('/api/v1/listings/availability/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['from'], str(self.date_from))
+        self.assertEqual(response.data['to'], str(self.date_to))
+        # Порядок запроса, без повторов, неактивных и несуществующих
+        self.assertEqual(response.data['listings'], [
+            {'id': mixed.pk, 'bitmap': '0000100'},
+            {'id': confirmed.pk, 'bitmap': '1110011'},
+            {'id': pending.pk, 'bitmap': '0000000'},
+        ])
+
+    def test_invalid_ids(self):
+        for ids in ['', 'a,b']:
+            response = self.client.get(
+                '/api/v1/listings/availability/', {'ids': ids}
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_constant_queries(self):
+        listings = []
+
+        def add_listings():
+            for number in range(3):
+                listing = create_listing(self.owner)
+                self.book(
+                    listing, (number, number + 2), BookingStatus.CONFIRMED
+                )
+                listings.append(listing)
+            params.update(self.params(listings))
+            # Каждый подсчет - с пустым кешем календарей
+            get_cache().clear()
+
+        params = {}
+        add_listings()
+        self.assertConstantQueries(
+            '/api/v1/listings/availability/', add_listings, params
+        )
+
+
+class SearchStatsTests(TestCase):
+    '''Счетчики поисковых запросов по часам, дням и за все время'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@test.de', 'pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+
+    def add_searches(self):
+        hours = timedelta(hours=1)
+        SearchTermStats.add_searches([
+            ('Berlin', self.now),
+            ('berlin  ', self.now - 2 * hours),
+            ('Munich', self.now - 2 * hours),
+            # Вне окна 24 часов, но в окне 7 дней
+            ('munich', self.now - 30 * hours),
+            ('munich', self.now - 40 * hours),
+            # Только за все время
+            ('hamburg', self.now - 10 * 24 * hours),
+            ('hamburg', self.now - 11 * 24 * hours),
+            ('hamburg', self.now - 12 * 24 * hours),
+        ])
+
+    def stats(self, **params):
+        response = self.client.get('/api/v1/listings/search-stats/', params)
+        self.assertEqual(response.status_code, 200)
+        return [
+            (row['term'], row['total_searches']) for row in response.data
+        ]
+
+    def test_rollup(self):
+        self.add_searches()
+        self.assertEqual(
+            self.stats(), [('hamburg', 3), ('munich', 3), ('berlin', 2)]
+        )
+        self.assertEqual(
+            self.stats(period='7d'), [('munich', 3), ('berlin', 2)]
+        )
+        self.assertEqual(
+            self.stats(period='24h'), [('berlin', 2), ('munich', 1)]
+        )
+        self.assertEqual(self.stats(limit=1), [('hamburg', 3)])
+        self.assertEqual(self.stats(period='24h', limit=1), [('berlin', 2)])
+        # Сумма часовых счетчиков равна дневным и общему
+        for period in StatsPeriod:
+            self.assertEqual(
+                sum(SearchTermStats.objects.filter(
+                    period=period
+                ).values_list('total_searches', flat=True)),
+                8
+            )
+
+    def test_invalid_params(self):
+        for params in [{'period': '1y'}, {'limit': 0}, {'limit': 1000}]:
+            response = self.client.get(
+                '/api/v1/listings/search-stats/', params
+            )
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_prune(self):
+        self.add_searches()
+        before = {
+            '24h': self.stats(period='24h'),
+            '7d': self.stats(period='7d'),
+            'all': self.stats()
+        }
+        out = StringIO()
+        call_command('prune_search_stats', stdout=out)
+        self.assertIn('outdated search stats deleted', out.getvalue())
+        # Удалены только счетчики вне окон, ответы не изменились
+        self.assertEqual(before, {
+            '24h': self.stats(period='24h'),
+            '7d': self.stats(period='7d'),
+            'all': self.stats()
+        })
+        hour = SearchTermStats.window_start(StatsPeriod.HOUR, self.now)
+        day = SearchTermStats.window_start(StatsPeriod.DAY, self.now)
+        self.assertFalse(SearchTermStats.objects.filter(
+            period=StatsPeriod.HOUR, bucket__lt=hour
+        ).exists())
+        self.assertFalse(SearchTermStats.objects.filter(
+            period=StatsPeriod.DAY, bucket__lt=day
+        ).exists())
+        self.assertEqual(
+            SearchTermStats.objects.filter(period=StatsPeriod.ALL).count(), 3
+        )
+        self.assertEqual(SearchTermStats.prune(self.now), 0)
+
+    def test_prune_on_flush(self):
+        self.add_searches()
+        search_log.pruned_at = None
+        self.addCleanup(setattr, search_log, 'pruned_at', None)
+        self.client.get('/api/v1/listings/', {'search': 'berlin'})
+        self.assertEqual(search_log.flush(), 1)
+        self.assertFalse(SearchTermStats.objects.filter(
+            period=StatsPeriod.HOUR,
+            bucket__lt=SearchTermStats.window_start(
+                StatsPeriod.HOUR, timezone.now()
+            )
+        ).exists())
+        self.assertEqual(self.stats(period='24h')[0], ('berlin', 3))
+
+
+class FacetsTests(TestCase):
+    '''Счетчики фасетов для текущего набора фильтров и поиска'''
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        for title, property_type, rooms, price in [
+            ('Berlin studio', PropertyType.STUDIO, 0, 40),
+            ('Berlin flat', PropertyType.APARTMENT, 1, 80),
+            ('Berlin flat', PropertyType.APARTMENT, 2, 150),
+            ('Berlin house', PropertyType.HOUSE, 5, 300),
+            ('Munich flat', PropertyType.APARTMENT, 3, 100),
+        ]:
+            Listing.objects.create(
+                title=title,
+                address='Germany',
+                property_type=property_type,
+                rooms=rooms,
+                price=price,
+                owner=owner
+            )
+
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        self.client = APIClient()
+
+    def facets(self, **params):
+        response = self.client.get('/api/v1/listings/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        return (
+            data['total'],
+            [row['count'] for row in data['property_type']],
+            [row['count'] for row in data['rooms']],
+            [row['count'] for row in data['price']]
+        )
+
+    def test_all(self):
+        # Типы: квартира, дом, студия; комнаты: 0-1, 2, 3, 4+;
+        # цена: 0-50, 50-100, 100-200, 200+
+        self.assertEqual(
+            self.facets(),
+            (5, [3, 1, 1], [2, 1, 1, 1], [1, 1, 2, 1])
+        )
+
+    def test_filters(self):
+        self.assertEqual(
+            self.facets(price__gte=100),
+            (3, [2, 1, 0], [0, 1, 1, 1], [0, 0, 2, 1])
+        )
+        self.assertEqual(
+            self.facets(
+                property_type=PropertyType.APARTMENT, rooms__range='1,2'
+            ),
+            (2, [2, 0, 0], [1, 1, 0, 0], [0, 1, 1, 0])
+        )
+
+    def test_search(self):
+        self.assertEqual(
+            self.facets(search='berlin'),
+            (4, [2, 1, 1], [2, 1, 0, 1], [1, 1, 1, 1])
+        )
+        self.assertEqual(
+            self.facets(search='flat', price__lte=120, ordering='-price'),
+            (2, [2, 0, 0], [1, 0, 1, 0], [0, 1, 1, 0])
+        )
+        self.assertEqual(self.facets(search='hamburg')[0], 0)
+
+
+class AvailabilityFilterTests(TestCase):
+    '''Фильтр свободных объявлений на период available_from/available_to'''
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.date_from = timezone.now().date() + timedelta(days=10)
+        cls.date_to = cls.date_from + timedelta(days=5)
+        cls.listings = {}
+        for name, nights, status in [
+            ('overlap', (-2, 1), BookingStatus.CONFIRMED),
+            ('inside', (2, 3), BookingStatus.CONFIRMED),
+            ('covering', (-1, 7), BookingStatus.CONFIRMED),
+            ('pending', (0, 5), BookingStatus.PENDING),
+            ('cancelled', (0, 5), BookingStatus.CANCELLED),
+            # Выезд в день начала периода, заезд в день его окончания
+            ('before', (-3, 0), BookingStatus.CONFIRMED),
+            ('after', (5, 8), BookingStatus.CONFIRMED),
+            ('free', None, None),
+        ]:
+            listing = create_listing(owner, name)
+            cls.listings[name] = listing.pk
+            if nights:
+                Booking.objects.create(
+                    listing=listing,
+                    user=cls.guest,
+                    check_in_date=cls.date_from + timedelta(days=nights[0]),
+                    check_out_date=cls.date_from + timedelta(days=nights[1]),
+                    status=status
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def available(self, params):
+        response = self.client.get('/api/v1/listings/', params)
+        self.assertEqual(response.status_code, 200)
+        ids = {row['id'] for row in response.data['results']}
+        return {name for name, pk in self.listings.items() if pk in ids}
+
+    def test_period(self):
+        self.assertEqual(self.available({
+            'available_from': self.date_from,
+            'available_to': self.date_to
+        }), {'pending', 'cancelled', 'before', 'after', 'free'})
+
+    def test_single_night(self):
+        # Только available_from - одна ночь date_from
+        self.assertEqual(
+            self.available({'available_from': self.date_from}),
+            {'inside', 'pending', 'cancelled', 'before', 'after', 'free'}
+        )
+        # Только available_to - ночь перед date_to
+        self.assertEqual(
+            self.available({'available_to': self.date_to}),
+            {
+                'overlap', 'inside', 'pending', 'cancelled', 'before',
+                'after', 'free'
+            }
+        )
+
+    def test_invalid_period(self):
+        response = self.client.get('/api/v1/listings/', {
+            'available_from': self.date_to,
+            'available_to': self.date_from
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchLogTests(TestCase):
+    '''История поиска анонимных пользователей по сессии или IP'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@test.de', 'pw')
+
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        search_log.flush()
+
+    def search(self, client, term, **extra):
+        response = client.get('/api/v1/listings/', {'search': term}, **extra)
+        self.assertEqual(response.status_code, 200)
+
+    def session_client(self):
+        client = APIClient()
+        # Сохраненная сессия - cookie с ключом сессии в клиенте
+        session = client.session
+        session['visited'] = True
+        session.save()
+        return client
+
+    def visitors(self):
+        return list(SearchHistory.objects.order_by('id').values_list(
+            'user_id', 'visitor', 'term'
+        ))
+
+    def test_session(self):
+        first, second = self.session_client(), self.session_client()
+        self.search(first, 'Berlin')
+        # Повторный запрос - из кеша списка, тоже записывается
+        self.search(first, 'Berlin')
+        self.search(second, 'berlin')
+        self.assertEqual(search_log.flush(), 3)
+        rows = self.visitors()
+        self.assertEqual([row[0] for row in rows], [None, None, None])
+        self.assertEqual(rows[0][1], rows[1][1])
+        self.assertNotEqual(rows[0][1], rows[2][1])
+        self.assertEqual(len(rows[0][1]), 40)
+        # В истории хранится хеш, а не ключ сессии
+        self.assertNotEqual(rows[0][1], first.session.session_key)
+
+    def test_ip_fallback(self):
+        client = APIClient()
+        self.search(client, 'munich', REMOTE_ADDR='10.0.0.1')
+        self.search(client, 'munich flat', REMOTE_ADDR='10.0.0.1')
+        self.search(client, 'munich', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(search_log.flush(), 3)
+        rows = self.visitors()
+        self.assertEqual([row[0] for row in rows], [None, None, None])
+        self.assertEqual(rows[0][1], rows[1][1])
+        self.assertNotEqual(rows[0][1], rows[2][1])
+        self.assertNotIn('10.0.0.1', rows[0][1])
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.search(client, 'Hamburg')
+        self.assertEqual(search_log.flush(), 1)
+        self.assertEqual(self.visitors(), [(self.user.pk, '', 'Hamburg')])
+
+    def test_stats_updated(self):
+        client = APIClient()
+        self.search(client, 'Berlin')
+        self.search(self.session_client(), ' berlin ')
+        self.search(client, 'munich')
+        self.assertEqual(search_log.flush(), 3)
+        for period in StatsPeriod:
+            self.assertEqual(
+                dict(SearchTermStats.objects.filter(
+                    period=period
+                ).values_list('term', 'total_searches')),
+                {'berlin': 2, 'munich': 1}
+            )
+
+
+class SparseFieldsTests(TestCase):
+    '''Поля ответа для ?fields=, ?view=card и ?expand=owner'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.listing = create_listing(cls.owner)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def get(self, params, status=200):
+        response = self.client.get('/api/v1/listings/', params)
+        self.assertEqual(response.status_code, status, response.data)
+        return response.data
+
+    def keys(self, params):
+        return set(self.get(params)['results'][0])
+
+    def test_fields(self):
+        self.assertEqual(self.keys({'fields': 'id,title'}), {'id', 'title'})
+        self.assertEqual(
+            self.keys({'fields': ' id , price,'}), {'id', 'price'}
+        )
+        # Без раскрытия владелец - id
+        row = self.get({'fields': 'id,owner'})['results'][0]
+        self.assertEqual(row, {'id': self.listing.pk, 'owner': self.owner.pk})
+
+    def test_card(self):
+        self.assertEqual(self.keys({'view': 'card'}), set(CARD_FIELDS))
+        # ?fields важнее ?view
+        self.assertEqual(
+            self.keys({'view': 'card', 'fields': 'id'}), {'id'}
+        )
+
+    def test_expand_owner(self):
+        row = self.get(
+            {'fields': 'id,owner', 'expand': 'owner'}
+        )['results'][0]
+        self.assertEqual(set(row), {'id', 'owner'})
+        self.assertEqual(
+            set(row['owner']),
+            set(UserSerializer(self.owner).data)
+        )
+        self.assertEqual(row['owner']['id'], self.owner.pk)
+        # Без ?fields владелец раскрыт всегда
+        full = self.get({})['results'][0]
+        self.assertIsInstance(full['owner'], dict)
+        self.assertNotIn('rating_sum', full)
+
+    def test_unknown_names(self):
+        data = self.get({'fields': 'id,rating_sum,foo'}, status=400)
+        self.assertEqual(
+            data['fields'], ['Unknown fields: foo, rating_sum.']
+        )
+        data = self.get({'fields': 'id', 'expand': 'listing'}, status=400)
+        self.assertEqual(data['expand'], ['Unknown fields: listing.'])
+        response = self.client.get(
+            f'/api/v1/listings/{self.listing.pk}/', {'fields': 'foo'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RatingSummaryTests(TestCase):
+    '''Рейтинг и распределение оценок совпадают с пересчетом по отзывам'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.listing = create_listing(
+            User.objects.create_user('owner', 'owner@test.de', 'pw')
+        )
+        cls.guests = [
+            User.objects.create_user(f'guest{number}') for number in range(3)
+        ]
+
+    def summary(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f'/api/v1/listings/{self.listing.pk}/rating-summary/'
+            )
+        self.assertEqual(response.status_code, 200)
+        # Отзывы не читаются - только счетчики объявления
+        self.assertFalse(any(
+            'reviews_review' in query['sql']
+            for query in context.captured_queries
+        ))
+        return response.data
+
+    def assertSummary(self, rating, counts):
+        data = self.summary()
+        self.listing.update_rating()
+        self.assertEqual(data['rating'], self.listing.rating)
+        self.assertEqual(data['number_of_reviews'], sum(counts.values()))
+        self.assertEqual(
+            data['number_of_reviews'], self.listing.number_of_reviews
+        )
+        self.assertAlmostEqual(data['rating'], rating)
+        self.assertEqual(data['distribution'], [
+            {'rating': value, 'count': counts.get(value, 0)}
+            for value in range(5, -1, -1)
+        ])
+        self.assertEqual(
+            data['distribution'], self.listing.rating_distribution()
+        )
+
+    def test_summary(self):
+        self.assertSummary(0.0, {})
+        first = Review.objects.create(
+            listing=self.listing, user=self.guests[0], rating=5
+        )
+        second = Review.objects.create(
+            listing=self.listing, user=self.guests[1], rating=4
+        )
+        Review.objects.create(
+            listing=self.listing, user=self.guests[2], rating=0
+        )
+        self.assertSummary(3.0, {5: 1, 4: 1, 0: 1})
+        second.rating = 1
+        second.save()
+        self.assertSummary(2.0, {5: 1, 1: 1, 0: 1})
+        first.delete()
+        self.assertSummary(0.5, {1: 1, 0: 1})
+
+    def test_not_found(self):
+        response = self.client.get(
+            f'/api/v1/listings/{self.listing.pk + 100}/rating-summary/'
+        )
+        self.assertEqual(response.status_code, 404)
@@ -1,28 +1,69 @@
 from datetime import timedelta
-from django.db.models import Count
-from rest_framework import generics, viewsets, permissions, filters
+from django.conf import settings
+from django.db.models import Sum, Value
+from django.utils import timezone
+from rest_framework import generics, viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema_view, extend_schema
+from drf_spectacular.utils import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter
+)
 
 from apps.listings.permissions import IsOwnerOrReadOnly
 from apps.listings.models import (
     PropertyType,
     Listing,
     ViewHistory,
-    SearchHistory
+    SearchHistory,
+    StatsPeriod,
+    SearchTermStats
 )
 from apps.listings.serializers import (
     ChoicesSerializer,
     ListingSerializer,
+    get_requested_fields,
+    is_owner_expanded,
     ViewHistorySerializer,
     SearchHistorySerializer,
-    SearchStatsSerializer
+    ReviewFeedQuerySerializer,
+    SearchStatsQuerySerializer,
+    SearchStatsSerializer,
+    CalendarQuerySerializer,
+    CalendarSerializer,
+    AvailabilityQuerySerializer,
+    AvailabilitySerializer,
+    FacetsSerializer,
+    CacheStatsSerializer,
+    RatingSummarySerializer,
+    HostSummaryQuerySerializer,
+    HostSummarySerializer
+)
+from apps.pagination import KeysetPagination
+from apps.listings.buffers import view_buffer
+from apps.listings.cache import (
+    get_cache,
+    cache_timeout,
+    query_cache_key,
+    CacheStats
+)
+from apps.listings.facets import count_facets
+from apps.listings.summary import get_host_summary
+from apps.listings.filters import (
+    ListingFilter,
+    CustomSearchFilter,
+    RankedOrderingFilter
+)
+from apps.listings.availability import (
+    get_reserved_periods,
+    get_reserved_periods_bulk,
+    periods_to_bitmap
 )
-from apps.listings.filters import CustomSearchFilter
 from apps.bookings.models import BookingStatus, Booking
+from apps.reviews.models import Review
 from apps.reviews.serializers import ReviewSerializer
 
 
@@ -45,7 +86,15 @@ class PropertyTypeListView(generics.ListAPIView):
 
 
 @extend_schema_view(
-    list=extend_schema(summary="Получить список всех активных объявлений", responses={},),
+    list=extend_schema(
+        summary="Получить список всех активных объявлений",
+        responses={},
+        parameters=[
+            OpenApiParameter('fields', str, description='Поля через запятую: id,title,price'),
+            OpenApiParameter('expand', str, description='owner - вложенный объект владельца'),
+            OpenApiParameter('view', str, enum=['card'], description='card - компактная карточка'),
+        ],
+    ),
     create=extend_schema(summary="Создать новое объявление",),
     retrieve=extend_schema(summary="Получить детальную информацию об объявления",),
     update=extend_schema(summary="Обновить объявление",),
@@ -60,20 +109,9 @@ class ListingViewSet(viewsets.ModelViewSet):
         DjangoFilterBackend,
         # filters.SearchFilter,
         CustomSearchFilter,
-        filters.OrderingFilter
+        RankedOrderingFilter
     ]
-    # https://docs.djangoproject.com/en/5.1/ref/models/querysets/#field-lookups
-    filterset_fields = {
-        # Цена (возможность указать минимальную и максимальную цену)
-        'price': ['lte', 'gte'],
-        # Количество комнат (возможность указать диапазон количества комнат)
-        'rooms': ['range'],
-        # Тип жилья (возможность выбрать тип жилья квартира,
-        # дом, студия и т.д.)
-        'property_type': ['exact'],
-        # Местоположение: (возможность указать город или район в Германии)
-        'address': ['icontains']
-    }
+    filterset_class = ListingFilter
     # Пользователь вводит ключевые слова, по которым производится поиск
     # в заголовках и описаниях объявлений
     search_fields = ['title', 'description']
@@ -88,33 +126,121 @@ class ListingViewSet(viewsets.ModelViewSet):
     ]
     ordering = ['id']
 
+    cache_stats = CacheStats('listing-list-cache')
+
     def get_queryset(self):
-        if self.action == 'list':
-            return Listing.objects.filter(is_active=True)
-        return Listing.objects.all()
+        queryset = Listing.objects.all()
+        if self.action in ['list', 'facets']:
+            # Явное сравнение (is_active = 1), а не просто WHERE is_active,
+            # иначе SQLite не использует индексы (is_active, ...)
+            queryset = queryset.filter(is_active=Value(True))
+        if self.action not in [
+            'list', 'retrieve', 'update', 'partial_update', 'my_created'
+        ]:
+            return queryset
+        requested, expand = get_requested_fields(self.request)
+        # Описание не читается из БД, если его нет в ?fields / ?view
+        if requested is not None and 'description' not in requested:
+            queryset = queryset.defer('description')
+        # Владелец с профилем - одним JOIN, а не запросом на каждую строку
+        if is_owner_expanded(requested, expand):
+            queryset = queryset.select_related('owner__profile')
+        return queryset
 
     def get_permissions(self):
         if self.action == 'create':
             return [permissions.IsAuthenticated()]
-        else:
+        elif self.action in [
+            'list', 'retrieve', 'update', 'partial_update', 'destroy'
+        ]:
             return [IsOwnerOrReadOnly()]
+        else:
+            # Для дополнительных действий - permission_classes из @action
+            return super().get_permissions()
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        # Кешируются только ответы анонимным пользователям
+        # (is_user_owner зависит от пользователя)
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        # Ссылки next/previous абсолютные: схема и хост входят в ключ
+        key = query_cache_key(
+            f'listing-list:{request.scheme}://{request.get_host()}',
+            request.query_params
+        )
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            self.cache_stats.miss()
+            response = super().list(request, *args, **kwargs)
+            cache.set(
+                key,
+                response.data,
+                cache_timeout(settings.LISTING_LIST_CACHE_TIMEOUT)
+            )
+            response['X-Cache'] = 'MISS'
+            return response
+        self.cache_stats.hit()
+        CustomSearchFilter().log_search(request, self)
+        return Response(data, headers={'X-Cache': 'HIT'})
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         # Запрет на просмотр неактивных объявлений, если это не владелец
-        if not instance.is_active and instance.owner != request.user:
+        if not instance.is_active and instance.owner_id != request.user.id:
             raise PermissionDenied()
-        # Если это не владелец, записываем просмотр
-        if request.user.is_authenticated and instance.owner != request.user:
-            ViewHistory.objects.update_or_create(
-                listing=instance,
-                user=request.user
+        # Если это не владелец, записываем просмотр (отложенно, пачками)
+        if request.user.is_authenticated and instance.owner_id != request.user.id:
+            view_buffer.record((instance.pk, request.user.pk))
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    @extend_schema(
+        summary="Получить количество объявлений по типу, комнатам и цене для текущих фильтров",
+        responses=FacetsSerializer
+    )
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='facets',
+        permission_classes=[permissions.AllowAny]
+    )
+    def facets(self, request):
+        # Сортировка и пагинация не влияют на счетчики
+        key = query_cache_key(
+            'listing-facets',
+            request.query_params,
+            ignore=['ordering', 'page', 'cursor', 'pagination', 'count']
+        )
+        cache = get_cache()
+        facets = cache.get(key)
+        if facets is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            facets = FacetsSerializer(count_facets(queryset)).data
+            cache.set(
+                key,
+                facets,
+                cache_timeout(settings.LISTING_FACETS_CACHE_TIMEOUT)
             )
-            instance.update_views()
-        return super().retrieve(request, *args, **kwargs)
+        return Response(facets)
+
+    @extend_schema(
+        summary="Получить статистику кеша списка объявлений",
+        responses=CacheStatsSerializer
+    )
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='list-cache-stats',
+        permission_classes=[permissions.IsAdminUser]
+    )
+    def list_cache_stats(self, request):
+        return Response(
+            CacheStatsSerializer(self.cache_stats.get()).data
+        )
 
     @extend_schema(summary="Получить список объявлений созданных аутентифицированным пользователем")
     @action(
@@ -124,10 +250,31 @@ class ListingViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def my_created(self, request):
-        queryset = Listing.objects.filter(owner=request.user)
+        queryset = self.get_queryset().filter(owner=request.user)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Получить сводку арендодателя по его объявлениям за период",
+        parameters=[HostSummaryQuerySerializer],
+        responses=HostSummarySerializer
+    )
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='host-summary',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def host_summary(self, request):
+        query = HostSummaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        summary = get_host_summary(
+            request.user,
+            query.validated_data['from'],
+            query.validated_data['to']
+        )
+        return Response(HostSummarySerializer(summary).data)
+
     @extend_schema(summary="Получить историю просмотренных объявлений аутентифицированного пользователя")
     @action(
         methods=['get'],
@@ -138,7 +285,7 @@ class ListingViewSet(viewsets.ModelViewSet):
     def my_view_history(self, request):
         view_history = ViewHistory.objects.filter(
             user=request.user
-        ).order_by('-viewed_at')
+        ).select_related('listing').order_by('-viewed_at')
         view_history = [view for view in view_history]
         serializer = ViewHistorySerializer(
             view_history, many=True, context={'request': request}
@@ -160,7 +307,11 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer = SearchHistorySerializer(search_history, many=True)
         return Response(serializer.data)
 
-    @extend_schema(summary="Получить список популярных поисковых запросов")
+    @extend_schema(
+        summary="Получить список популярных поисковых запросов",
+        parameters=[SearchStatsQuerySerializer],
+        responses=SearchStatsSerializer(many=True)
+    )
     @action(
         methods=['get'],
         detail=False,
@@ -168,14 +319,26 @@ class ListingViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def search_stats(self, request):
-        search_stats = (
-            SearchHistory.objects
-            .values('term')
-            .annotate(total_searches=Count('term'))
-            .order_by('-total_searches')
-        )
-        search_stats = [search for search in search_stats]
-        serializer = SearchStatsSerializer(search_stats, many=True)
+        query = SearchStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        period = query.validated_data['period']
+        limit = query.validated_data['limit']
+        # Счетчики SearchTermStats вместо GROUP BY по всей истории
+        if period == 'all':
+            search_stats = SearchTermStats.objects.filter(
+                period=StatsPeriod.ALL,
+                bucket=SearchTermStats.EPOCH
+            ).values('term', 'total_searches')
+        else:
+            period = StatsPeriod.HOUR if period == '24h' else StatsPeriod.DAY
+            search_stats = SearchTermStats.objects.filter(
+                period=period,
+                bucket__gte=SearchTermStats.window_start(
+                    period, timezone.now()
+                )
+            ).values('term').annotate(total_searches=Sum('total_searches'))
+        search_stats = search_stats.order_by('-total_searches', 'term')
+        serializer = SearchStatsSerializer(search_stats[:limit], many=True)
         return Response(serializer.data)
 
     @extend_schema(summary="Получить список забронированых периодов для объявления")
@@ -224,20 +387,114 @@ class ListingViewSet(viewsets.ModelViewSet):
         reserved_dates = sorted(list(reserved_dates))
         return Response(reserved_dates)
 
-    @extend_schema(summary="Получить список отзывов для объявления")
+    @extend_schema(
+        summary="Получить календарь занятости объявления за период",
+        parameters=[CalendarQuerySerializer],
+        responses=CalendarSerializer
+    )
     @action(
         methods=['get'],
         detail=True,
-        url_path='reviews',
+        url_path='calendar',
         permission_classes=[permissions.AllowAny]
     )
+    def calendar(self, request, pk=None):
+        listing = self.get_object()
+        query = CalendarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        date_from = query.validated_data['from']
+        date_to = query.validated_data['to']
+        periods = get_reserved_periods(listing.pk, date_from, date_to)
+        calendar = {'from': date_from, 'to': date_to, 'periods': periods}
+        if query.validated_data['bitmap']:
+            calendar['bitmap'] = periods_to_bitmap(periods, date_from, date_to)
+        return Response(CalendarSerializer(calendar).data)
+
+    @extend_schema(
+        summary="Получить матрицу занятости для списка объявлений",
+        parameters=[AvailabilityQuerySerializer],
+        responses=AvailabilitySerializer
+    )
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='availability',
+        permission_classes=[permissions.AllowAny]
+    )
+    def availability(self, request):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        date_from = query.validated_data['from']
+        date_to = query.validated_data['to']
+        active_ids = set(Listing.objects.filter(
+            pk__in=query.validated_data['ids'],
+            is_active=Value(True)
+        ).values_list('pk', flat=True))
+        listing_ids = [
+            pk for pk in query.validated_data['ids'] if pk in active_ids
+        ]
+        periods = get_reserved_periods_bulk(listing_ids, date_from, date_to)
+        availability = {
+            'from': date_from,
+            'to': date_to,
+            'listings': [
+                {
+                    'id': pk,
+                    'bitmap': periods_to_bitmap(
+                        periods[pk], date_from, date_to
+                    )
+                }
+                for pk in listing_ids
+            ]
+        }
+        return Response(AvailabilitySerializer(availability).data)
+
+    @extend_schema(
+        summary="Получить список отзывов для объявления",
+        parameters=[
+            ReviewFeedQuerySerializer,
+            OpenApiParameter('cursor', str, description='Курсор страницы (из ссылок next/previous)'),
+        ],
+        responses=ReviewSerializer(many=True)
+    )
+    @action(
+        methods=['get'],
+        detail=True,
+        url_path='reviews',
+        permission_classes=[permissions.AllowAny],
+        pagination_class=KeysetPagination
+    )
     def reviews(self, request, pk=None):
         listing = self.get_object()
-        reviews = listing.reviews.all()
+        query = ReviewFeedQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        # Страница по ключу (created_at/rating, id) по индексам
+        # review_listing_created_idx / review_listing_rating_idx
+        reviews = Review.objects.filter(
+            listing_id=listing.pk
+        ).select_related(
+            'user__profile'
+        ).order_by(query.validated_data['ordering'])
+        page = self.paginate_queryset(reviews)
         serializer = ReviewSerializer(
-            reviews, many=True, context={'request': request}
+            page, many=True, context={'request': request}
         )
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        summary="Получить рейтинг объявления и распределение оценок",
+        responses=RatingSummarySerializer
+    )
+    @action(
+        methods=['get'],
+        detail=True,
+        url_path='rating-summary',
+        permission_classes=[permissions.AllowAny]
+    )
+    def rating_summary(self, request, pk=None):
+        # Счетчики хранятся в Listing, отзывы не читаются
+        listing = self.get_object()
+        return Response(RatingSummarySerializer(listing).data)
 
     @extend_schema(summary="Получить виды недвижимости с их кодами")
     @action(
@@ -0,0 +1,302 @@
+'''
+Пагинация списков (REST_FRAMEWORK['DEFAULT_PAGINATION_CLASS']).
+
+    ?page=N                 - постраничная пагинация (OFFSET + COUNT(*))
+    ?page=N&count=false     - без подсчета общего количества
+    ?pagination=cursor      - первая страница пагинации по ключу,
+    ?cursor=...             - следующие страницы (ссылки next/previous)
+'''
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+FALSE_VALUES = ('false', '0', 'no', 'off')
+
+
+def encode_value(value):
+    '''Значение поля сортировки для курсора (без потери точности)'''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Пагинация по ключу: вместо OFFSET следующая страница выбирается
+    условием WHERE (field, ..., id) > (last_value, ..., last_id)
+    по индексу, COUNT(*) не выполняется.
+    Сортировка берется из queryset (OrderingFilter или Meta.ordering)
+    по всем полям, в конец добавляется id (в направлении первого поля)
+    для стабильного порядка.
+    '''
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, queryset):
+        '''Поля сортировки [(field, descending), ...], последнее - id'''
+        ordering = (
+            list(queryset.query.order_by)
+            or list(queryset.model._meta.ordering)
+            or ['id']
+        )
+        fields = []
+        for field in ordering:
+            field = str(field)
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            field = 'id' if field == 'pk' else field
+            if field in dict(fields):
+                continue
+            fields.append((field, descending))
+            # id уникален: следующие поля не влияют на порядок
+            if field == 'id':
+                return fields
+        return fields + [('id', fields[0][1])]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = cursor['v']
+            if not isinstance(values, list):
+                raise ValueError
+            return {
+                'values': values,
+                'id': int(cursor['i']),
+                'reverse': bool(cursor.get('r'))
+            }
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_field(self, queryset, name):
+        '''Поле модели или аннотация (search_rank), задающие сортировку'''
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def clean_values(self, queryset, values):
+        '''
+        Значения курсора в типы полей сортировки (курсор мог быть
+        изменен), id в конце
+        '''
+        fields = [field for field, _ in self.fields[:-1]]
+        if len(values) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        cleaned = []
+        for field, value in zip(fields, values):
+            try:
+                value = self.get_field(queryset, field).to_python(value)
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    def encode_cursor(self, obj, reverse):
+        cursor = {
+            'v': [
+                encode_value(getattr(obj, field))
+                for field, _ in self.fields[:-1]
+            ],
+            'i': obj.pk
+        }
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(cursor, separators=(',', ':')).encode()
+        ).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fields = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        # Направление обхода: при движении назад сортировка обращается
+        directions = [
+            (field, descending != reverse)
+            for field, descending in self.fields
+        ]
+        queryset = queryset.order_by(*[
+            f'{"-" if descending else ""}{field}'
+            for field, descending in directions
+        ])
+        if cursor:
+            values = self.clean_values(queryset, cursor['values'])
+            values.append(cursor['id'])
+            # (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ... по направлениям
+            condition, equal = Q(), Q()
+            for (field, descending), value in zip(directions, values):
+                lookup = 'lt' if descending else 'gt'
+                condition |= equal & Q(**{f'{field}__{lookup}': value})
+                equal &= Q(**{field: value})
+            queryset = queryset.filter(condition)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {
+                    'type': 'string', 'nullable': True, 'format': 'uri'
+                },
+                'results': schema,
+            },
+        }
+
+
+class CountlessPageNumberPagination(PageNumberPagination):
+    '''
+    Постраничная пагинация без COUNT(*): выбирается на одну запись
+    больше размера страницы, чтобы узнать, есть ли следующая.
+    '''
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(
+                request.query_params.get(self.page_query_param, 1)
+            )
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        offset = (self.page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.page_query_param, self.page_number + 1
+        )
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.page_query_param, self.page_number - 1
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return KeysetPagination().get_paginated_response_schema(schema)
+
+
+class ListPagination(PageNumberPagination):
+    '''
+    PageNumberPagination по умолчанию, режимы без COUNT(*)
+    (?count=false) и по ключу (?pagination=cursor / ?cursor=...)
+    делегируются соответствующим классам.
+    '''
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def get_delegate(self, request):
+        if (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        ):
+            return KeysetPagination()
+        count = request.query_params.get(self.count_query_param, '')
+        if count.lower() in FALSE_VALUES:
+            return CountlessPageNumberPagination()
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.get_delegate(request)
+        if self.delegate is not None:
+            return self.delegate.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.delegate is not None:
+            return self.delegate.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        return parameters + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'cursor - пагинация по ключу',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': KeysetPagination.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы (из ссылок next/previous)',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'false - не считать общее количество',
+                'schema': {'type': 'boolean'},
+            },
+        ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_rating_distribution'),
+        ('reviews', '0002_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', 'created_at'], name='review_listing_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', 'rating'], name='review_listing_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def remove_duplicate_reviews(apps, schema_editor):
+    # Оставляем последний отзыв для каждой пары (user, listing)
+    # и пересчитываем рейтинг затронутых объявлений
+    Review = apps.get_model('reviews', 'Review')
+    Listing = apps.get_model('listings', 'Listing')
+    duplicates = (
+        Review.objects
+        .values('user', 'listing')
+        .annotate(count=Count('id'), last_id=Max('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    listing_ids = set()
+    for duplicate in duplicates:
+        Review.objects.filter(
+            user=duplicate['user'],
+            listing=duplicate['listing']
+        ).exclude(id=duplicate['last_id']).delete()
+        listing_ids.add(duplicate['listing'])
+    if not listing_ids:
+        return
+    reviews = Review.objects.filter(
+        listing=OuterRef('pk')
+    ).order_by().values('listing')
+    counters = {
+        'rating_sum': reviews.annotate(total=Sum('rating')),
+        'number_of_reviews': reviews.annotate(total=Count('id')),
+    }
+    for rating in range(6):
+        counters[f'rating_{rating}_count'] = reviews.filter(
+            rating=rating
+        ).annotate(total=Count('id'))
+    listings = Listing.objects.filter(pk__in=listing_ids)
+    listings.update(**{
+        field: Coalesce(Subquery(subquery.values('total')), 0)
+        for field, subquery in counters.items()
+    })
+    listings.update(
+        rating=Coalesce(
+            Cast(F('rating_sum'), models.FloatField())
+            / NullIf(F('number_of_reviews'), 0),
+            0.0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_rating_distribution'),
+        ('reviews', '0003_review_feed_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_reviews, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('user', 'listing'), name='review_user_listing_unique'),
+        ),
+    ]
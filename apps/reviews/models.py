@@ -29,3 +29,29 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        # Один отзыв пользователя на объявление - проверяет сама БД
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'listing'],
+                name='review_user_listing_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['listing', 'updated_at'],
+                name='review_listing_updated_idx'
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='review_user_updated_idx'
+            ),
+            # Лента отзывов объявления (listings.views.reviews)
+            models.Index(
+                fields=['listing', 'created_at'],
+                name='review_listing_created_idx'
+            ),
+            models.Index(
+                fields=['listing', 'rating'],
+                name='review_listing_rating_idx'
+            ),
+        ]
@@ -1,13 +1,43 @@
+from django.db import transaction, IntegrityError
+from django.db.models import Exists, OuterRef
 from django.urls import reverse
 from rest_framework import serializers
 
+from apps.listings.models import Listing
 from apps.reviews.models import Review
 from apps.bookings.models import BookingStatus, Booking
 from apps.users.serializers import UserSerializer
 
 
+class EligibleListingField(serializers.PrimaryKeyRelatedField):
+    '''
+    Объявление отзыва, загружаемое одним запросом вместе с признаками
+    has_review (отзыв уже оставлен) и has_booking (есть подтвержденное
+    бронирование) текущего пользователя
+    '''
+    def get_queryset(self):
+        request = self.context.get('request')
+        queryset = Listing.objects.only('id', 'owner', 'is_active')
+        # Признаки нужны только при создании отзыва
+        if request is None or self.parent.instance is not None:
+            return queryset
+        user = request.user
+        return queryset.annotate(
+            has_review=Exists(Review.objects.filter(
+                listing=OuterRef('pk'),
+                user=user.pk
+            )),
+            has_booking=Exists(Booking.objects.filter(
+                listing=OuterRef('pk'),
+                user=user.pk,
+                status=BookingStatus.CONFIRMED
+            ))
+        )
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    listing = EligibleListingField()
     listing_url = serializers.SerializerMethodField()
 
     class Meta:
@@ -23,43 +53,52 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
 
     def validate(self, data):
-        request = self.context.get('request')
         listing = data.get('listing')
-        user = request.user
+        if self.instance is not None:
+            # Отзыв нельзя перенести на другое объявление
+            if listing and listing.pk != self.instance.listing_id:
+                raise serializers.ValidationError(
+                    'The listing of a review cannot be changed.'
+                )
+            return data
+        user = self.context.get('request').user
         if not listing.is_active:
             raise serializers.ValidationError(
                 'You cannot leave a review for inactive listing.'
             )
         # Проверяем, существует ли уже отзыв от этого пользователя
         # на это объявление
-        existing_review = Review.objects.filter(
-            user=user, listing=listing
-        ).exists()
-        if existing_review:
+        if listing.has_review:
             raise serializers.ValidationError(
                 'You have already left a review for this listing.'
             )
-        if listing.owner == user:
+        if listing.owner_id == user.id:
             raise serializers.ValidationError(
                 'You cannot leave a review for your listing.'
             )
         # Проверка, что у пользователя есть подтвержденное
         # бронирование для этого объявления
-        has_booking = Booking.objects.filter(
-            listing=listing,
-            user=user,
-            status=BookingStatus.CONFIRMED
-        ).exists()
-        if not has_booking:
+        if not listing.has_booking:
             raise serializers.ValidationError(
                 'You can only leave a review if you have a confirmed booking.'
             )
         return data
 
+    def create(self, validated_data):
+        # Повторный отзыв, прошедший проверку has_review одновременно
+        # с первым, отклоняет уникальный индекс (user, listing)
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                'You have already left a review for this listing.'
+            )
+
     def get_listing_url(self, obj) -> str:
         request = self.context.get('request')
         if request:
             return request.build_absolute_uri(
-                reverse('listing-detail', kwargs={'pk': obj.pk})
+                reverse('listing-detail', kwargs={'pk': obj.listing_id})
             )
         return None
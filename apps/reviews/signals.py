@@ -1,14 +1,47 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
+
 from apps.reviews.models import Review
+from apps.listings.models import Listing
+from apps.listings.cache import invalidate_listings
+
+
+@receiver(post_init, sender=Review)
+def remember_counted_rating(sender, instance, **kwargs):
+    # Объявление и оценка, учтенные в рейтинге (для расчета разницы).
+    # __dict__, чтобы не загружать отложенные (defer) поля
+    instance.counted_rating = (
+        instance.__dict__.get('listing_id'),
+        instance.__dict__.get('rating')
+    )
 
 
 @receiver(post_save, sender=Review)
-def update_listing_rating_on_save(sender, instance, created, **kwargs):
-    if created:
-        instance.listing.update_rating()
+def update_listing_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    listing_id, rating = instance.counted_rating
+    if raw or (not created and rating is None):
+        # loaddata или оценка не была загружена - полный пересчет
+        for pk in {listing_id, instance.listing_id} - {None}:
+            Listing(pk=pk).update_rating()
+    elif created:
+        Listing.add_rating(instance.listing_id, added=instance.rating)
+    elif listing_id != instance.listing_id:
+        Listing.add_rating(listing_id, removed=rating)
+        Listing.add_rating(instance.listing_id, added=instance.rating)
+    elif rating != instance.rating:
+        Listing.add_rating(listing_id, added=instance.rating, removed=rating)
+    else:
+        return
+    instance.counted_rating = (instance.listing_id, instance.rating)
+    transaction.on_commit(invalidate_listings)
 
 
 @receiver(post_delete, sender=Review)
 def update_listing_rating_on_delete(sender, instance, **kwargs):
-    instance.listing.update_rating()
+    listing_id, rating = instance.counted_rating
+    if rating is None:
+        Listing(pk=instance.listing_id).update_rating()
+    else:
+        Listing.add_rating(listing_id, removed=rating)
+    transaction.on_commit(invalidate_listings)
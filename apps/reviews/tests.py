@@ -1,3 +1,171 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.testing import QueryCountMixin
+from apps.listings.models import Listing, PropertyType
+from apps.bookings.models import BookingStatus, Booking
+from apps.reviews.models import Review
+
+
+class QueryCountTests(QueryCountMixin, TestCase):
+    '''Число запросов эндпоинтов отзывов не зависит от числа строк'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+        self.counter = 0
+
+    def add_reviews(self):
+        for _ in range(3):
+            self.counter += 1
+            listing = Listing.objects.create(
+                title=f'Flat {self.counter}',
+                address='Berlin',
+                property_type=PropertyType.APARTMENT,
+                rooms=2,
+                price=100,
+                owner=self.owner
+            )
+            Review.objects.create(listing=listing, user=self.guest, rating=5)
+
+    def test_review_list(self):
+        self.add_reviews()
+        self.assertConstantQueries('/api/v1/reviews/', self.add_reviews)
+
+
+class ReviewCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guest = User.objects.create_user('guest', 'guest@test.de', 'pw')
+        cls.listing = Listing.objects.create(
+            title='Flat',
+            address='Berlin',
+            property_type=PropertyType.APARTMENT,
+            rooms=2,
+            price=100,
+            owner=cls.owner
+        )
+        Booking.objects.create(
+            listing=cls.listing,
+            user=cls.guest,
+            check_in_date=date(2026, 1, 1),
+            check_out_date=date(2026, 1, 3),
+            status=BookingStatus.CONFIRMED
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def test_eligibility_single_read(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                '/api/v1/reviews/', {'listing': self.listing.pk, 'rating': 4}
+            )
+        self.assertEqual(response.status_code, 201)
+        selects = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(len(selects), 1, selects)
+
+    def test_duplicate_review(self):
+        data = {'listing': self.listing.pk, 'rating': 4}
+        self.assertEqual(self.client.post('/api/v1/reviews/', data).status_code, 201)
+        self.assertEqual(self.client.post('/api/v1/reviews/', data).status_code, 400)
+        self.assertEqual(Review.objects.count(), 1)
+
+
+class RatingCounterTests(TestCase):
+    '''
+    Инкрементальные счетчики рейтинга (reviews.signals) после каждого
+    изменения совпадают с пересчетом по всем отзывам (update_rating)
+    '''
+    COUNTER_FIELDS = ['rating', 'rating_sum', 'number_of_reviews'] + [
+        Listing.rating_count_field(rating) for rating in Listing.RATING_VALUES
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@test.de', 'pw')
+        cls.guests = [
+            User.objects.create_user(f'guest{number}') for number in range(3)
+        ]
+        cls.first, cls.second = [
+            Listing.objects.create(
+                title=title,
+                address='Berlin',
+                property_type=PropertyType.APARTMENT,
+                rooms=2,
+                price=100,
+                owner=cls.owner
+            )
+            for title in ['First', 'Second']
+        ]
+
+    def counters(self, listing):
+        return Listing.objects.values(*self.COUNTER_FIELDS).get(pk=listing.pk)
+
+    def assertCounters(self, listing, **expected):
+        counters = self.counters(listing)
+        for field, value in expected.items():
+            self.assertEqual(counters[field], value, field)
+        listing.update_rating()
+        self.assertEqual(counters, self.counters(listing))
 
-# Create your tests here.
+    def test_create_update_move_delete(self):
+        five = Review.objects.create(
+            listing=self.first, user=self.guests[0], rating=5
+        )
+        review = Review.objects.create(
+            listing=self.first, user=self.guests[1], rating=3
+        )
+        self.assertCounters(
+            self.first, rating=4.0, rating_sum=8, number_of_reviews=2,
+            rating_5_count=1, rating_3_count=1
+        )
+        # Изменение оценки учитывается один раз
+        review.rating = 1
+        review.save()
+        review.save()
+        self.assertCounters(
+            self.first, rating=3.0, rating_sum=6, number_of_reviews=2,
+            rating_3_count=0, rating_1_count=1
+        )
+        # Перенос отзыва на другое объявление
+        review.listing = self.second
+        review.rating = 2
+        review.save()
+        self.assertCounters(
+            self.first, rating=5.0, rating_sum=5, number_of_reviews=1,
+            rating_1_count=0
+        )
+        self.assertCounters(
+            self.second, rating=2.0, rating_sum=2, number_of_reviews=1,
+            rating_2_count=1
+        )
+        review.delete()
+        self.assertCounters(
+            self.second, rating=0.0, rating_sum=0, number_of_reviews=0,
+            rating_2_count=0
+        )
+        # Оценка не загружена (defer) - полный пересчет
+        five = Review.objects.only('id', 'listing').get(pk=five.pk)
+        five.rating = 0
+        five.save()
+        self.assertCounters(
+            self.first, rating=0.0, rating_sum=0, number_of_reviews=1,
+            rating_5_count=0, rating_0_count=1
+        )
+        Review.objects.only('id', 'listing').get(pk=five.pk).delete()
+        self.assertCounters(self.first, number_of_reviews=0, rating_0_count=0)
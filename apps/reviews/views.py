@@ -20,9 +20,10 @@ class ReviewViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        queryset = Review.objects.select_related('user__profile')
         if self.action == 'list':
-            return Review.objects.filter(user=self.request.user)
-        return Review.objects.all()
+            return queryset.filter(user=self.request.user)
+        return queryset
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -0,0 +1,31 @@
+'''
+Общие вспомогательные классы для тестов приложений.
+'''
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    '''
+    Проверка отсутствия N+1: число SQL-запросов эндпоинта
+    не должно зависеть от количества строк в ответе
+    '''
+    def count_queries(self, path, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, path)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, path, add_rows, params=None):
+        '''
+        Сравнить число запросов до и после add_rows()
+        (add_rows добавляет строки, попадающие в ответ)
+        '''
+        before = self.count_queries(path, params)
+        add_rows()
+        after = self.count_queries(path, params)
+        self.assertEqual(
+            before, after,
+            f'{path} {params or ""}: {before} queries before, '
+            f'{after} after adding rows'
+        )
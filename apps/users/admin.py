@@ -2,7 +2,9 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 
-from apps.users.models import Profile
+from apps.users.models import (
+    Profile, RevokedToken, TokenWatermark, ThrottleCounter
+)
 
 
 class ProfileInline(admin.StackedInline):
@@ -18,3 +20,6 @@ admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 
 admin.site.register(Profile)
+admin.site.register(RevokedToken)
+admin.site.register(TokenWatermark)
+admin.site.register(ThrottleCounter)
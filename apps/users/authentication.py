@@ -0,0 +1,135 @@
+'''
+Аутентификация по JWT без запросов к БД в установившемся режиме.
+
+Токен декодируется один раз за запрос: JWTAuthMiddleware сохраняет
+его в request.jwt_token, CachedJWTAuthentication (DRF) использует
+готовый токен, а пользователя берет из кеша user_cache.
+Отзыв токенов проверяется по revocation_store (apps.users.revocation).
+'''
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.users.revocation import revocation_store
+
+
+class UserCache:
+    '''
+    LRU кеш пользователей с TTL в памяти процесса:
+    {user_id: (expires, values)}, values - значения полей User
+    (None - пользователь не найден). Каждый запрос получает
+    собственный экземпляр User, собранный из values без запроса к БД.
+    Записи сбрасываются сигналами (users.signals.py) в текущем
+    процессе, в остальных воркерах - по истечении TTL
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # Увеличивается при каждом сбросе: значение, прочитанное из БД
+        # до сброса, не попадает в кеш
+        self.generation = 0
+        self.field_names = [
+            field.attname for field in User._meta.concrete_fields
+        ]
+
+    @property
+    def options(self):
+        return settings.AUTH_USER_CACHE
+
+    def load(self, user_id):
+        return User.objects.filter(pk=user_id).values_list(
+            *self.field_names
+        ).first()
+
+    def get(self, user_id):
+        '''Пользователь по id или None, если его нет'''
+        key = str(user_id)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                values = entry[1]
+            else:
+                entry = None
+                generation = self.generation
+        if entry is None:
+            values = self.load(user_id)
+            with self.lock:
+                if generation == self.generation:
+                    self.entries[key] = (now + self.options['TTL'], values)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.options['MAX_SIZE']:
+                        self.entries.popitem(last=False)
+        if values is None:
+            return None
+        return User.from_db(User.objects.db, self.field_names, values)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''
+    JWTAuthentication, использующая токен, уже декодированный
+    JWTAuthMiddleware, и пользователя из user_cache
+    '''
+    def authenticate(self, request):
+        token = getattr(request, 'jwt_token', None)
+        if token is None:
+            return super().authenticate(request)
+        return self.get_user(token), token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            ) from e
+        if revocation_store.is_revoked(validated_token):
+            raise AuthenticationFailed(
+                _('Token is revoked'), code='token_revoked'
+            )
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(
+                _('User not found'), code='user_not_found'
+            )
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive'
+            )
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."),
+                    code='password_changed'
+                )
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    '''Схема аутентификации CachedJWTAuthentication для drf-spectacular'''
+    target_class = CachedJWTAuthentication
+
+
+user_cache = UserCache()
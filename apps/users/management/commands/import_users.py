@@ -0,0 +1,39 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from apps.users.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортировать пользователей с профилями из CSV '
+        '(username,email,password,description)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV файл с заголовком')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with open(options['path'], newline='', encoding='utf-8') as file:
+            rows = [row for row in csv.DictReader(file) if row.get('username')]
+        # Уже существующие пользователи пропускаются
+        existing = set(User.objects.filter(
+            username__in=[row['username'] for row in rows]
+        ).values_list('username', flat=True))
+        seen = set()
+        new_rows = []
+        for row in rows:
+            if row['username'] in existing or row['username'] in seen:
+                continue
+            seen.add(row['username'])
+            new_rows.append(row)
+        users, _ = Profile.bulk_create_users(
+            new_rows, batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            f'{len(users)} users imported, '
+            f'{len(rows) - len(users)} skipped.'
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.users.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = 'Удалить отозванные токены с истекшим сроком действия'
+
+    def handle(self, *args, **options):
+        deleted, _ = RevokedToken.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+        self.stdout.write(f'{deleted} expired revoked tokens deleted.')
@@ -2,10 +2,18 @@ from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
-from django.contrib.auth.models import User
+
+from apps.users.authentication import user_cache
+from apps.users.revocation import revocation_store
 
 
 class JWTAuthMiddleware(MiddlewareMixin):
+    '''
+    Аутентификация по JWT из cookies. Декодированный access токен
+    сохраняется в request.jwt_token для CachedJWTAuthentication,
+    пользователь проверяется по кешу user_cache, отзыв токена -
+    по revocation_store
+    '''
     def process_request(self, request):
         access_token = request.COOKIES.get('access_token')
         refresh_token = request.COOKIES.get('refresh_token')
@@ -13,10 +21,14 @@ class JWTAuthMiddleware(MiddlewareMixin):
             try:
                 token = AccessToken(access_token)
                 user_id = token.get('user_id')
-                if not User.objects.filter(id=user_id).exists():
+                if (
+                    revocation_store.is_revoked(token)
+                    or user_cache.get(user_id) is None
+                ):
                     request.bad_token = True
                     return
                 request.META['HTTP_AUTHORIZATION'] = f'Bearer {access_token}'
+                request.jwt_token = token
                 return
             except TokenError:
                 pass
@@ -25,12 +37,16 @@ class JWTAuthMiddleware(MiddlewareMixin):
             try:
                 refresh_token = RefreshToken(refresh_token)
                 user_id = refresh_token.get('user_id')
-                if not User.objects.filter(id=user_id).exists():
+                if (
+                    revocation_store.is_revoked(refresh_token)
+                    or user_cache.get(user_id) is None
+                ):
                     request.bad_token = True
                     return
                 new_access_token = refresh_token.access_token
                 request.META['HTTP_AUTHORIZATION'] = f'Bearer {new_access_token}'
                 request.new_access_token = new_access_token
+                request.jwt_token = new_access_token
             except TokenError:
                 pass
 
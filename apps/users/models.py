@@ -1,5 +1,7 @@
-from django.db import models
+from datetime import datetime, timezone
+from django.db import models, connection, transaction, IntegrityError
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
 
 
 # https://dev.to/earthcomfy/django-user-profile-3hik
@@ -14,3 +16,200 @@ class Profile(models.Model):
 
     def __str__(self):
         return self.user.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения, прочитанные из БД (для сохранения только изменений)
+        instance.saved_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self):
+        '''Поля, измененные после загрузки или последнего сохранения'''
+        saved_values = getattr(self, 'saved_values', {})
+        return [
+            field.attname for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (
+                field.attname not in saved_values
+                or self.__dict__[field.attname] != saved_values[field.attname]
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        '''
+        Сохраняются только измененные поля, если изменений нет -
+        запрос к БД не выполняется
+        '''
+        if (
+            not self._state.adding
+            and hasattr(self, 'saved_values')
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        self.saved_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    @classmethod
+    def bulk_create_users(cls, rows, batch_size=500):
+        '''
+        Создание пользователей с профилями: по одному bulk_create
+        для User и Profile (сигналы post_save не вызываются).
+        rows - словари username, email, password, description;
+        без password пароль не задается (set_unusable_password)
+        '''
+        users = [
+            User(
+                username=row['username'],
+                email=row.get('email', ''),
+                password=make_password(row.get('password') or None)
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=batch_size)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # MySQL не возвращает id созданных строк
+                ids = dict(User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list('username', 'id'))
+                for user in users:
+                    user.pk = ids[user.username]
+            profiles = cls.objects.bulk_create(
+                [
+                    cls(user=user, description=row.get('description') or None)
+                    for user, row in zip(users, rows)
+                ],
+                batch_size=batch_size
+            )
+        return users, profiles
+
+
+class RevokedToken(models.Model):
+    '''
+    Отозванный JWT (по jti). Хранится до истечения срока действия
+    токена, проверяется через apps.users.revocation.revocation_store
+    '''
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='revoked_tokens',
+        null=True
+    )
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['revoked_at'], name='revokedtoken_revoked_idx'),
+            models.Index(fields=['expires_at'], name='revokedtoken_expires_idx'),
+        ]
+
+    def __str__(self):
+        return self.jti
+
+    @classmethod
+    def revoke(cls, tokens, user=None):
+        '''Отозвать токены (AccessToken / RefreshToken)'''
+        revoked = [
+            cls(
+                jti=token['jti'],
+                user=user,
+                expires_at=datetime.fromtimestamp(token['exp'], tz=timezone.utc)
+            )
+            for token in tokens
+        ]
+        cls.objects.bulk_create(revoked, ignore_conflicts=True)
+        return revoked
+
+
+class TokenWatermark(models.Model):
+    '''
+    Все токены пользователя, выпущенные до not_before, отозваны
+    (выход на всех устройствах)
+    '''
+    user = models.OneToOneField(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='token_watermark'
+    )
+    not_before = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='tokenwatermark_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} tokens before {self.not_before}'
+
+    @classmethod
+    def revoke_all(cls, user):
+        '''
+        Отозвать все выпущенные пользователю токены.
+        iat в JWT - целые секунды, поэтому отметка тоже округляется
+        до секунды: токен, выпущенный в ту же секунду (вход сразу
+        после выхода), остается действительным
+        '''
+        watermark, _ = cls.objects.update_or_create(
+            user=user,
+            defaults={
+                'not_before': datetime.now(tz=timezone.utc).replace(
+                    microsecond=0
+                )
+            }
+        )
+        return watermark
+
+
+class ThrottleCounter(models.Model):
+    '''
+    Счетчик попыток входа (apps.users.throttling) в общей для всех
+    воркеров БД: key - ключ окна троттлинга или статистики,
+    expires_at - после этого момента строку можно удалить
+    (None - бессрочно)
+    '''
+    key = models.CharField(max_length=255, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='throttlecounter_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.key}: {self.count}'
+
+    @classmethod
+    def incr(cls, key, expires_at=None):
+        '''
+        Атомарно увеличить счетчик (UPDATE count = count + 1,
+        при отсутствии строки - INSERT), возвращает новое значение
+        '''
+        counters = cls.objects.filter(key=key)
+        if not counters.update(count=models.F('count') + 1):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(key=key, count=1, expires_at=expires_at)
+            except IntegrityError:
+                # Строку одновременно создал другой воркер
+                counters.update(count=models.F('count') + 1)
+            else:
+                # Новое окно: заодно удаляем истекшие счетчики
+                cls.objects.filter(
+                    expires_at__lte=datetime.now(tz=timezone.utc)
+                ).delete()
+                return 1
+        return counters.values_list('count', flat=True).first() or 0
@@ -0,0 +1,104 @@
+'''
+Проверка отзыва JWT без запросов к БД на каждый запрос.
+
+Отозванные токены (RevokedToken) и отметки "токены до" пользователей
+(TokenWatermark) копируются в память процесса и догружаются из БД
+не чаще раза в settings.AUTH_TOKEN_REVOCATION['REFRESH_INTERVAL']
+секунд. Отзыв в текущем процессе действует сразу, в остальных
+воркерах - после ближайшего обновления.
+'''
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from apps.users.models import RevokedToken, TokenWatermark
+
+
+class RevocationStore:
+    '''
+    jtis - {jti: exp} действующих отозванных токенов,
+    not_before - {user_id: timestamp} отметки пользователей.
+    Обновление инкрементальное: по revoked_at / updated_at
+    с запасом OVERLAP на транзакции, закоммиченные с опозданием
+    '''
+    OVERLAP = timedelta(minutes=1)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jtis = {}
+        self.not_before = {}
+        self.loaded_until = None
+        self.refreshed_at = None
+
+    @property
+    def options(self):
+        return settings.AUTH_TOKEN_REVOCATION
+
+    def refresh(self, force=False):
+        interval = self.options['REFRESH_INTERVAL']
+        if (
+            not force
+            and self.refreshed_at is not None
+            and time.monotonic() - self.refreshed_at < interval
+        ):
+            return
+        with self.lock:
+            if (
+                not force
+                and self.refreshed_at is not None
+                and time.monotonic() - self.refreshed_at < interval
+            ):
+                return
+            now = datetime.now(tz=timezone.utc)
+            revoked = RevokedToken.objects.filter(expires_at__gt=now)
+            watermarks = TokenWatermark.objects.all()
+            if self.loaded_until is not None:
+                since = self.loaded_until - self.OVERLAP
+                revoked = revoked.filter(revoked_at__gte=since)
+                watermarks = watermarks.filter(updated_at__gte=since)
+            for jti, expires_at in revoked.values_list('jti', 'expires_at'):
+                self.jtis[jti] = expires_at.timestamp()
+            for user_id, not_before in watermarks.values_list(
+                'user_id', 'not_before'
+            ):
+                self.not_before[str(user_id)] = not_before.timestamp()
+            # Истекшие токены и так недействительны
+            timestamp = now.timestamp()
+            self.jtis = {
+                jti: exp for jti, exp in self.jtis.items() if exp > timestamp
+            }
+            self.loaded_until = now
+            self.refreshed_at = time.monotonic()
+
+    def is_revoked(self, token):
+        self.refresh()
+        if token.get('jti') in self.jtis:
+            return True
+        not_before = self.not_before.get(str(token.get('user_id')))
+        # Сравнение с точностью до секунды, как у iat
+        return (
+            not_before is not None
+            and token.get('iat', 0) < int(not_before)
+        )
+
+    def revoke(self, tokens, user=None):
+        '''Отозвать токены (в БД и сразу в текущем процессе)'''
+        for token in RevokedToken.revoke(tokens, user):
+            self.jtis[token.jti] = token.expires_at.timestamp()
+
+    def revoke_all(self, user):
+        '''Отозвать все токены пользователя'''
+        watermark = TokenWatermark.revoke_all(user)
+        self.not_before[str(user.pk)] = watermark.not_before.timestamp()
+
+    def clear(self):
+        with self.lock:
+            self.jtis = {}
+            self.not_before = {}
+            self.loaded_until = None
+            self.refreshed_at = None
+
+
+revocation_store = RevocationStore()
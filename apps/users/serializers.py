@@ -4,7 +4,11 @@ from django.urls import reverse
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
 from apps.users.models import Profile
+from apps.users.revocation import revocation_store
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -112,3 +116,23 @@ class EmailTokenObtainPairSerializer(serializers.Serializer):
             'access': str(refresh.access_token),
         }
         return data
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # Отозванный refresh токен не выпускает новых access токенов
+        if revocation_store.is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token is revoked')
+        return super().validate(attrs)
+
+
+class SignoutSerializer(serializers.Serializer):
+    # true - выйти на всех устройствах (отозвать все токены)
+    all = serializers.BooleanField(default=False)
+    refresh = serializers.CharField(required=False)
+
+
+class ThrottleStatsSerializer(serializers.Serializer):
+    scope = serializers.CharField()
+    allowed = serializers.IntegerField()
+    throttled = serializers.IntegerField()
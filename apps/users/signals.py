@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 
 from apps.users.models import Profile
+from apps.users.authentication import user_cache
 
 
 @receiver(post_save, sender=User)
@@ -12,5 +14,18 @@ def create_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def save_profile(sender, instance, created, **kwargs):
+    # Профиль сохраняется, только если он загружен вместе с User
+    # и изменен (Profile.save записывает лишь измененные поля)
+    if not created and User.profile.is_cached(instance):
+        instance.profile.save()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Деактивация/удаление пользователя действуют сразу, а повторный
+    # сброс после коммита убирает значение, прочитанное до коммита
+    user_id = instance.pk
+    user_cache.invalidate(user_id)
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
@@ -1,3 +1,316 @@
-from django.test import TestCase
+import time
+from datetime import datetime, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from apps.testing import QueryCountMixin
+from apps.users.models import Profile, RevokedToken, TokenWatermark
+from apps.users.authentication import user_cache
+from apps.users.revocation import revocation_store
+from apps.users.throttling import SlidingWindowThrottle
+
+
+class QueryCountTests(QueryCountMixin, TestCase):
+    '''Число запросов эндпоинтов пользователей не зависит от числа строк'''
+    def setUp(self):
+        self.client = APIClient()
+        self.counter = 0
+
+    def add_users(self):
+        for _ in range(3):
+            self.counter += 1
+            name = f'user{self.counter}'
+            User.objects.create_user(name, f'{name}@test.de', 'pw')
+
+    def test_user_list(self):
+        self.add_users()
+        self.assertConstantQueries('/api/v1/users/', self.add_users)
+
+
+class LoginThrottleTests(TestCase):
+    '''Ограничение попыток входа по email и по IP'''
+    url = '/api/v1/users/signin/'
+
+    def setUp(self):
+        self.client = APIClient()
+        # Начало окна, время попыток задается вручную
+        self.now = 6000.0
+        for name, value in [
+            ('THROTTLE_RATES', {'login_email': '2/min', 'login_ip': '3/min'}),
+            ('timer', lambda throttle: self.now),
+        ]:
+            patcher = mock.patch.object(SlidingWindowThrottle, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def signin(self, email, **headers):
+        return self.client.post(
+            self.url, {'email': email, 'password': 'wrong'}, **headers
+        ).status_code
+
+    def test_email_limit(self):
+        self.assertEqual(self.signin('a@test.de'), 400)
+        self.assertEqual(self.signin('A@test.de '), 400)
+        response = self.client.post(
+            self.url, {'email': 'a@test.de', 'password': 'wrong'}
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.signin('b@test.de', REMOTE_ADDR='10.0.0.1'), 400)
+
+    def test_ip_limit(self):
+        for number in range(3):
+            self.assertEqual(self.signin(f'{number}@test.de'), 400)
+        self.assertEqual(self.signin('x@test.de'), 429)
+        self.assertEqual(
+            self.signin('y@test.de', REMOTE_ADDR='10.0.0.1'), 400
+        )
+
+    @override_settings(TRUSTED_PROXIES=['127.0.0.1'])
+    def test_real_ip_header(self):
+        # От доверенного прокси X-Real-IP - адрес клиента
+        for number in range(4):
+            self.assertEqual(self.signin(
+                f'{number}@test.de', HTTP_X_REAL_IP=f'1.2.3.{number}'
+            ), 400)
+        # Клиент напрямую: подставленный заголовок игнорируется
+        for number in range(3):
+            self.assertEqual(self.signin(
+                f'{number}@test.de',
+                REMOTE_ADDR='8.8.8.8',
+                HTTP_X_REAL_IP=f'1.2.3.{number}'
+            ), 400)
+        self.assertEqual(self.signin(
+            'x@test.de', REMOTE_ADDR='8.8.8.8', HTTP_X_REAL_IP='1.2.3.9'
+        ), 429)
+
+    def test_window_expiry(self):
+        for status_code in [400, 400, 429]:
+            self.assertEqual(self.signin('a@test.de'), status_code)
+        # Начало следующего окна: 3 * 55/60 + 1 попыток > 2
+        self.now += 65
+        self.assertEqual(self.signin('a@test.de'), 429)
+        # Через окно предыдущие попытки не учитываются
+        self.now += 120
+        self.assertEqual(self.signin('a@test.de'), 400)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+class ProfileSaveTests(TestCase):
+    '''Сохранение только измененных полей профиля и массовый импорт'''
+    def profile_queries(self, action):
+        with CaptureQueriesContext(connection) as context:
+            action()
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'users_profile' in query['sql']
+        ]
+
+    def test_user_save_without_profile_changes(self):
+        User.objects.create_user('guest', 'guest@test.de', 'pw')
+        # Профиль не загружен
+        user = User.objects.get(username='guest')
+        self.assertEqual(self.profile_queries(user.save), [])
+        # Профиль загружен, но не изменен
+        user = User.objects.select_related('profile').get(username='guest')
+        self.assertEqual(self.profile_queries(user.save), [])
+        user.profile.description = 'Hi'
+        queries = self.profile_queries(user.save)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith('UPDATE'))
+        # Записывается только измененное поле
+        self.assertNotIn('user_id', queries[0])
+        self.assertEqual(self.profile_queries(user.save), [])
+        self.assertEqual(Profile.objects.get().description, 'Hi')
+
+    def bulk_create(self, start, count):
+        rows = [
+            {
+                'username': f'user{number}',
+                'email': f'user{number}@test.de',
+                'password': f'secret{number}',
+                'description': f'User {number}'
+            }
+            for number in range(start, start + count)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            Profile.bulk_create_users(rows)
+        return len(context.captured_queries)
+
+    def test_bulk_create_users(self):
+        self.assertEqual(self.bulk_create(0, 2), self.bulk_create(2, 20))
+        self.assertEqual(Profile.objects.count(), 22)
+        user = User.objects.select_related('profile').get(username='user7')
+        self.assertNotEqual(user.password, 'secret7')
+        self.assertTrue(user.check_password('secret7'))
+        self.assertEqual(user.profile.description, 'User 7')
+        users, _ = Profile.bulk_create_users([{'username': 'nopassword'}])
+        self.assertFalse(users[0].has_usable_password())
+
+
+class RevocationTests(TestCase):
+    '''Отзыв JWT: выход, выход на всех устройствах, обновление списка'''
+    url = '/api/v1/users/my-profile/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@test.de', 'pw')
+
+    def setUp(self):
+        user_cache.clear()
+        revocation_store.clear()
+        self.addCleanup(revocation_store.clear)
+
+    def get(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client.get(self.url).status_code
+
+    def refresh(self, refresh):
+        return APIClient().post(
+            '/api/v1/users/token/refresh/', {'refresh': str(refresh)}
+        ).status_code
+
+    def test_signout(self):
+        refresh = RefreshToken.for_user(self.user)
+        access = refresh.access_token
+        other = RefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.get(access), 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = client.post(
+            '/api/v1/users/signout/', {'refresh': str(refresh)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(access), 401)
+        self.assertEqual(self.refresh(refresh), 401)
+        # Токены другого входа действуют
+        self.assertEqual(self.get(other), 200)
+
+    def test_revoke_all(self):
+        access = AccessToken.for_user(self.user)
+        refresh = RefreshToken.for_user(self.user)
+        # Токены выпущены секундой раньше выхода
+        for token in [access, refresh]:
+            token['iat'] -= 1
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = client.post('/api/v1/users/signout/', {'all': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(access), 401)
+        self.assertEqual(self.refresh(refresh), 401)
+
+    def test_same_second_login(self):
+        revocation_store.revoke_all(self.user)
+        not_before = TokenWatermark.objects.get(user=self.user).not_before
+        self.assertEqual(not_before.microsecond, 0)
+        # Вход в ту же секунду, что и выход
+        token = AccessToken.for_user(self.user)
+        token['iat'] = int(not_before.timestamp())
+        self.assertFalse(revocation_store.is_revoked(token))
+        self.assertEqual(self.get(token), 200)
+        token['iat'] -= 1
+        self.assertTrue(revocation_store.is_revoked(token))
+        # Отметка с долями секунды (записанная до округления)
+        TokenWatermark.objects.filter(user=self.user).update(
+            not_before=datetime.fromtimestamp(
+                token['iat'] + 1.5, tz=timezone.utc
+            )
+        )
+        revocation_store.refresh(force=True)
+        token['iat'] += 1
+        self.assertFalse(revocation_store.is_revoked(token))
+
+    def test_refresh_from_database(self):
+        token = AccessToken.for_user(self.user)
+        self.assertFalse(revocation_store.is_revoked(token))
+        # Отзыв в другом воркере: виден после обновления списка
+        RevokedToken.revoke([token], self.user)
+        self.assertFalse(revocation_store.is_revoked(token))
+        with mock.patch.dict(
+            'django.conf.settings.AUTH_TOKEN_REVOCATION',
+            {'REFRESH_INTERVAL': 0}
+        ):
+            self.assertTrue(revocation_store.is_revoked(token))
+        other = AccessToken.for_user(self.user)
+        TokenWatermark.objects.create(
+            user=self.user,
+            not_before=datetime.fromtimestamp(
+                other['iat'] + 1, tz=timezone.utc
+            )
+        )
+        revocation_store.refresh(force=True)
+        self.assertTrue(revocation_store.is_revoked(other))
+
+
+class UserCacheTests(TestCase):
+    '''
+    Аутентификация по JWT без запросов в установившемся режиме,
+    деактивация и удаление пользователя действуют сразу
+    '''
+    # Эндпоинт без собственных запросов к БД
+    url = '/api/v1/listings/property-types/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('guest', 'guest@test.de', 'pw')
+
+    def setUp(self):
+        user_cache.clear()
+        revocation_store.clear()
+        self.addCleanup(user_cache.clear)
+        self.addCleanup(revocation_store.clear)
+        self.token = AccessToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def get(self, url=None):
+        return self.client.get(url or self.url).status_code
+
+    def test_warm_request_without_queries(self):
+        self.assertEqual(self.get(), 200)
+        self.assertIn(str(self.user.pk), user_cache.entries)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(), 200)
+        # Через cookie (JWTAuthMiddleware) - тоже без запросов
+        client = APIClient()
+        client.cookies['access_token'] = str(self.token)
+        with self.assertNumQueries(0):
+            response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.wsgi_request.jwt_token)
+
+    def test_deactivated_user_evicted(self):
+        self.assertEqual(self.get('/api/v1/users/my-profile/'), 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get(), 401)
+        self.assertEqual(self.get('/api/v1/users/my-profile/'), 401)
+
+    def test_deleted_user_evicted(self):
+        self.assertEqual(self.get(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).delete()
+        self.assertEqual(self.get(), 401)
+
+    def test_ttl(self):
+        self.assertEqual(self.get(), 200)
+        # Изменение в другом процессе (без сигнала) - видно после TTL
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get(), 200)
+        now = time.monotonic()
+        with mock.patch(
+            'apps.users.authentication.time.monotonic',
+            return_value=now + settings.AUTH_USER_CACHE['TTL'] + 1
+        ):
+            self.assertEqual(self.get(), 401)
@@ -0,0 +1,178 @@
+'''
+Ограничение попыток входа (SigninView, TokenObtainPairView).
+
+Скользящее окно: счетчики текущего и предыдущего окна длиной
+duration, оценка числа попыток - current + previous * (доля
+предыдущего окна, еще попадающая в интервал).
+Счетчики увеличиваются атомарно и общие для всех воркеров: таблица
+ThrottleCounter (по умолчанию) или кеш settings.LOGIN_THROTTLE_CACHE
+с атомарным incr (Redis, Memcached; locmem - только для разработки).
+Троттлинг DRF выполняется до обработчика view, то есть до проверки
+пароля.
+'''
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from rest_framework.throttling import SimpleRateThrottle
+
+from apps.users.models import ThrottleCounter
+from apps.utils import get_client_ip
+
+
+class DatabaseCounters:
+    '''Счетчики в таблице ThrottleCounter (UPDATE count = count + 1)'''
+    def incr(self, key, timeout=None):
+        expires_at = None
+        if timeout:
+            expires_at = datetime.now(tz=timezone.utc) + timedelta(
+                seconds=timeout
+            )
+        return ThrottleCounter.incr(key, expires_at)
+
+    def get_many(self, keys):
+        return dict(ThrottleCounter.objects.filter(
+            Q(expires_at__isnull=True)
+            | Q(expires_at__gt=datetime.now(tz=timezone.utc)),
+            key__in=keys
+        ).values_list('key', 'count'))
+
+
+class CacheCounters:
+    '''
+    Счетчики в кеше. Атомарный incr есть только у Redis и Memcached
+    (LocMemCache - атомарный, но в пределах одного процесса);
+    в DatabaseCache и FileBasedCache incr - это get + set,
+    параллельные попытки теряют увеличения
+    '''
+    backends = ['RedisCache', 'PyMemcacheCache', 'PyLibMCCache', 'LocMemCache']
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        if type(self.cache).__name__ not in self.backends:
+            raise ImproperlyConfigured(
+                f'LOGIN_THROTTLE_CACHE: cache "{alias}" has no atomic incr.'
+            )
+
+    def incr(self, key, timeout=None):
+        if self.cache.add(key, 1, timeout):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Ключ истек между add и incr
+            self.cache.add(key, 1, timeout)
+            return 1
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+
+def get_counters():
+    alias = settings.LOGIN_THROTTLE_CACHE
+    if alias is None:
+        return DatabaseCounters()
+    return CacheCounters(alias)
+
+
+class ThrottleStats:
+    '''Счетчики пропущенных и отклоненных попыток (get_counters)'''
+    prefix = 'login-throttle-stats'
+
+    def key(self, scope, name):
+        return f'{self.prefix}:{scope}:{name}'
+
+    def count(self, scope, name):
+        get_counters().incr(self.key(scope, name))
+
+    def get(self, scopes):
+        keys = {
+            (scope, name): self.key(scope, name)
+            for scope in scopes
+            for name in ['allowed', 'throttled']
+        }
+        counts = get_counters().get_many(list(keys.values()))
+        return [
+            {
+                'scope': scope,
+                'allowed': counts.get(keys[(scope, 'allowed')], 0),
+                'throttled': counts.get(keys[(scope, 'throttled')], 0)
+            }
+            for scope in scopes
+        ]
+
+
+throttle_stats = ThrottleStats()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    '''
+    SimpleRateThrottle со скользящим окном на двух счетчиках
+    вместо списка времен всех запросов (одно чтение и один incr)
+    '''
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+        counters = get_counters()
+        previous = counters.get_many([previous_key]).get(previous_key, 0)
+        current = counters.incr(current_key, self.duration * 2)
+        self.elapsed = (self.now % self.duration) / self.duration
+        self.previous, self.current = previous, current
+        if previous * (1 - self.elapsed) + current > self.num_requests:
+            throttle_stats.count(self.scope, 'throttled')
+            return False
+        throttle_stats.count(self.scope, 'allowed')
+        return True
+
+    def wait(self):
+        remaining = self.duration * (1 - self.elapsed)
+        if self.current <= self.num_requests:
+            # Ждем, пока вес предыдущего окна снизится
+            return max(
+                remaining - self.duration
+                * (self.num_requests - self.current) / self.previous,
+                0
+            )
+        # Текущее окно станет предыдущим, и его вес должен снизиться
+        return remaining + self.duration * (
+            1 - self.num_requests / self.current
+        )
+
+
+class LoginIPThrottle(SlidingWindowThrottle):
+    '''Попытки входа с одного IP'''
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': get_client_ip(request)
+        }
+
+
+class LoginEmailThrottle(SlidingWindowThrottle):
+    '''Попытки входа в один аккаунт (по email или username)'''
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        try:
+            login = request.data.get('email') or request.data.get('username')
+        except AttributeError:
+            return None
+        if not login or not isinstance(login, str):
+            return None
+        ident = hashlib.md5(login.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginEmailThrottle]
@@ -1,12 +1,14 @@
 from django.urls import path, include
-from rest_framework_simplejwt import views
 from rest_framework.routers import DefaultRouter
 
 from apps.users.views import (
     SignupView,
     SigninView,
     SignoutView,
+    UsernameTokenObtainPairView,
     EmailTokenObtainPairView,
+    RevocableTokenRefreshView,
+    LoginThrottleStatsView,
     ProtectedView,
     UserViewSet
 )
@@ -19,15 +21,20 @@ urlpatterns = [
     path('signup/', SignupView.as_view(), name='signup'),
     path('signin/', SigninView.as_view(), name='signin'),
     path('signout/', SignoutView.as_view(), name='signout'),
+    path(
+        'login-throttle-stats/',
+        LoginThrottleStatsView.as_view(),
+        name='login_throttle_stats'
+    ),
 
     path(
         'token/',
-        views.TokenObtainPairView.as_view(),
+        UsernameTokenObtainPairView.as_view(),
         name='token_obtain_pair'
     ),  # by username
     path(
         'token/refresh/',
-        views.TokenRefreshView.as_view(),
+        RevocableTokenRefreshView.as_view(),
         name='token_refresh'
     ),
     path(
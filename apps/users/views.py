@@ -4,9 +4,10 @@ from rest_framework import views, viewsets, mixins, permissions, status
 from rest_framework.decorators import action
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth.models import User
 from drf_spectacular.utils import extend_schema_view, extend_schema
 
@@ -14,9 +15,14 @@ from apps.users.serializers import (
     SignupSerializer,
     SigninSerializer,
     EmailTokenObtainPairSerializer,
+    RevocableTokenRefreshSerializer,
+    SignoutSerializer,
+    ThrottleStatsSerializer,
     UserSerializer
 )
 from apps.users.permissions import IsOwnerOrReadOnly
+from apps.users.revocation import revocation_store
+from apps.users.throttling import LOGIN_THROTTLES, throttle_stats
 
 
 def token_to_response(response, user):
@@ -79,6 +85,7 @@ class SignupView(GenericAPIView):
 class SigninView(GenericAPIView):
     permission_classes = [AllowAny]
     serializer_class = SigninSerializer
+    throttle_classes = LOGIN_THROTTLES
 
     @extend_schema(summary="Аутентифицировать пользователя")
     def post(self, request, *args, **kwargs):
@@ -110,21 +117,65 @@ class SigninView(GenericAPIView):
             )
 
 
-class SignoutView(views.APIView):
+class SignoutView(GenericAPIView):
     permission_classes = [IsAuthenticated]
+    serializer_class = SignoutSerializer
 
-    @extend_schema(
-        summary="Выйти из системы", request=None, responses={200: None}
-    )
+    @extend_schema(summary="Выйти из системы", responses={200: None})
     def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['all']:
+            revocation_store.revoke_all(request.user)
+        else:
+            # Текущий access токен и refresh токен из cookie или запроса
+            tokens = [request.auth] if request.auth is not None else []
+            refresh_token = (
+                serializer.validated_data.get('refresh')
+                or request.COOKIES.get('refresh_token')
+            )
+            if refresh_token:
+                try:
+                    refresh_token = RefreshToken(refresh_token)
+                except TokenError:
+                    refresh_token = None
+            if (
+                refresh_token is not None
+                and str(refresh_token.get('user_id')) == str(request.user.pk)
+            ):
+                tokens.append(refresh_token)
+            revocation_store.revoke(tokens, request.user)
         response = Response({'msg': 'Bye!'}, status=status.HTTP_200_OK)
         response.delete_cookie('access_token')
         response.delete_cookie('refresh_token')
         return response
 
 
+class UsernameTokenObtainPairView(TokenObtainPairView):
+    throttle_classes = LOGIN_THROTTLES
+
+
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailTokenObtainPairSerializer
+    throttle_classes = LOGIN_THROTTLES
+
+
+class RevocableTokenRefreshView(TokenRefreshView):
+    serializer_class = RevocableTokenRefreshSerializer
+
+
+class LoginThrottleStatsView(views.APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Получить статистику ограничения попыток входа",
+        responses=ThrottleStatsSerializer(many=True)
+    )
+    def get(self, request, *args, **kwargs):
+        stats = throttle_stats.get(
+            [throttle.scope for throttle in LOGIN_THROTTLES]
+        )
+        return Response(ThrottleStatsSerializer(stats, many=True).data)
 
 
 class ProtectedView(views.APIView):
@@ -151,7 +202,7 @@ class UserViewSet(
     mixins.UpdateModelMixin,
     viewsets.GenericViewSet
 ):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('profile').order_by('id')
     serializer_class = UserSerializer
     permission_classes = [IsOwnerOrReadOnly]
 
@@ -163,6 +214,6 @@ class UserViewSet(
         permission_classes=[permissions.IsAuthenticated]
     )
     def my_profile(self, request):
-        queryset = User.objects.get(pk=request.user.pk)
+        queryset = self.get_queryset().get(pk=request.user.pk)
         serializer = self.get_serializer(queryset)
         return Response(serializer.data)
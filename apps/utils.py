@@ -0,0 +1,34 @@
+import functools
+import ipaddress
+
+from django.conf import settings
+
+
+@functools.lru_cache
+def get_trusted_networks(proxies):
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in proxies]
+
+
+def is_trusted_proxy(address):
+    '''Адрес входит в settings.TRUSTED_PROXIES?'''
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in network
+        for network in get_trusted_networks(tuple(settings.TRUSTED_PROXIES))
+    )
+
+
+def get_client_ip(request):
+    '''
+    IP клиента: nginx передает его в X-Real-IP (nginx/default.conf).
+    Заголовок учитывается только в запросах от доверенного прокси,
+    иначе клиент мог бы подставить в него любой адрес
+    '''
+    remote_addr = request.META.get('REMOTE_ADDR') or ''
+    real_ip = request.META.get('HTTP_X_REAL_IP')
+    if real_ip and is_trusted_proxy(remote_addr):
+        return real_ip
+    return remote_addr
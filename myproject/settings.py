@@ -113,6 +113,16 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / f'{env("SQLITE_DATABASE")}',
+            # Ожидание блокировки записи (Listing.lock_rows) вместо
+            # немедленной ошибки "database is locked"
+            'OPTIONS': {
+                'timeout': 20,
+            },
+            # Тестовая БД в файле: в памяти (shared cache) параллельные
+            # транзакции получают "table is locked" вместо ожидания
+            'TEST': {
+                'NAME': BASE_DIR / f'test_{env("SQLITE_DATABASE")}',
+            },
         }
     }
 
@@ -167,15 +177,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'apps.pagination.ListPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Попытки входа (apps.users.throttling): с одного IP и в один аккаунт
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_email': '5/min',
+    },
 }
 
 SIMPLE_JWT = {
@@ -198,3 +213,96 @@ SPECTACULAR_SETTINGS = {
     },
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+
+# ---------------------------------------------------------------------
+
+
+# Поисковый движок объявлений (apps.listings.search):
+# 'auto' - FTS5 для SQLite, FULLTEXT для MySQL, иначе индекс в памяти,
+# либо путь к классу движка
+LISTING_SEARCH_BACKEND = env('LISTING_SEARCH_BACKEND', default='auto')
+# InvertedIndexSearchBackend: сколько лучших результатов ранжируется
+# по релевантности (остальные найденные - с search_rank = 0)
+LISTING_SEARCH_MAX_RANKED = 500
+
+# Календарь занятости объявлений (apps.listings.availability)
+# Время жизни в общем кеше; в locmem - LISTINGS_LOCAL_CACHE_TIMEOUT
+LISTING_CALENDAR_CACHE_TIMEOUT = 60 * 60
+LISTING_CALENDAR_DEFAULT_DAYS = 90
+LISTING_CALENDAR_MAX_DAYS = 366
+LISTING_AVAILABILITY_MAX_IDS = 50
+
+# Максимум бронирований в пакетном подтверждении/отклонении
+BOOKING_BULK_MAX_IDS = 100
+# Истечение ожидающих бронирований (apps.bookings.expiry): старше
+# MAX_AGE_HOURS часов или с наступившей датой заезда, UPDATE порциями
+# по CHUNK_SIZE строк. INTERVAL - период запуска планировщика в процессе
+# в секундах (0 - выключен, только команда expire_bookings)
+BOOKING_EXPIRY = {
+    'MAX_AGE_HOURS': 72,
+    'CHUNK_SIZE': 500,
+    'INTERVAL': env.int('BOOKING_EXPIRY_INTERVAL', default=0),
+}
+
+# Отложенная запись просмотров объявлений (apps.listings.buffers):
+# сохранение пачкой раз в FLUSH_INTERVAL секунд или по MAX_SIZE событий
+LISTING_VIEW_BUFFER = {
+    'MAX_SIZE': 1000,
+    'FLUSH_INTERVAL': 5,
+}
+# Отложенная запись истории поиска (apps.listings.buffers)
+LISTING_SEARCH_LOG_BUFFER = {
+    'MAX_SIZE': 500,
+    'FLUSH_INTERVAL': 5,
+}
+LISTING_SEARCH_STATS_MAX_LIMIT = 100
+# Как часто (секунды) удалять устаревшие счетчики SearchTermStats
+LISTING_SEARCH_STATS_PRUNE_INTERVAL = 3600
+LISTING_FACETS_CACHE_TIMEOUT = 60
+LISTING_LIST_CACHE_TIMEOUT = 30
+
+# Кеш пользователей для аутентификации по JWT (apps.users.authentication):
+# количество записей и время жизни записи в секундах
+AUTH_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+# Отзыв JWT (apps.users.revocation): обновление списка
+# отозванных токенов из БД раз в REFRESH_INTERVAL секунд
+AUTH_TOKEN_REVOCATION = {
+    'REFRESH_INTERVAL': 30,
+}
+
+# Кеши: default - память процесса, throttle - см. LOGIN_THROTTLE_CACHE,
+# listings - ответы, фасеты и календари объявлений (apps.listings.cache).
+# Общий для воркеров кеш объявлений (сброс сразу виден всем) - например
+#   LISTINGS_CACHE_URL=redis://redis:6379/2
+#   LISTINGS_CACHE_URL=dbcache://listings_cache (manage.py createcachetable)
+# С locmem (по умолчанию) данные в других воркерах устаревают не более
+# чем на LISTINGS_LOCAL_CACHE_TIMEOUT секунд
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'listings': env.cache(
+        'LISTINGS_CACHE_URL', default='locmemcache://listings'
+    ),
+    'throttle': env.cache(
+        'THROTTLE_CACHE_URL', default='locmemcache://throttle'
+    ),
+}
+# Счетчики попыток входа (apps.users.throttling): по умолчанию (None) -
+# таблица ThrottleCounter в общей БД, атомарный UPDATE count = count + 1.
+# Иначе - алиас кеша с атомарным incr, например
+#   LOGIN_THROTTLE_CACHE=throttle THROTTLE_CACHE_URL=redis://redis:6379/1
+# locmem - только для разработки: лимит действует в каждом процессе
+# отдельно. dbcache/filecache не подходят: incr в них - get + set
+LISTINGS_CACHE = 'listings'
+LISTINGS_LOCAL_CACHE_TIMEOUT = 5
+LOGIN_THROTTLE_CACHE = env('LOGIN_THROTTLE_CACHE', default=None)
+# Прокси, которым доверяется заголовок X-Real-IP (apps.utils.get_client_ip):
+# адреса или сети, по умолчанию - локальный хост и сети docker (nginx)
+TRUSTED_PROXIES = env.list(
+    'TRUSTED_PROXIES', default=['127.0.0.1', '::1', '172.16.0.0/12']
+)
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_wsgi_application()
+
+# Планировщик истечения бронирований - только в веб-процессе
+# и только при заданном BOOKING_EXPIRY['INTERVAL']
+from apps.bookings.expiry import expiry_scheduler  # noqa: E402
+
+expiry_scheduler.start()